@@ -0,0 +1,24 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import resource
+
+import numpy as np
+
+
+def random_feature_vectors(n_images, rng, n_features=324, n_active=81):
+    """
+    Random binary feature vectors with n_active active tc neurons, as produced by the HOG pre-processing.
+    """
+    feature_vectors = np.zeros((n_images, n_features), dtype=np.uint8)
+    for feature_vector in feature_vectors:
+        feature_vector[rng.choice(n_features, n_active, replace=False)] = 1
+
+    return feature_vectors
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB (ru_maxrss is in kB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
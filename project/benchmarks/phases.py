@@ -0,0 +1,156 @@
+"""
+Phase benchmark suite: drives Network through build, training, retrieval and sleep for a range of network sizes and
+records, for every phase and size, the wall time, real-time factor, peak RSS, number of connections and number of spikes.
+
+Every size runs in its own process, so the peak RSS of a size is not inflated by the previous ones. Run from the project
+directory, e.g.:
+
+    python -m benchmarks.phases --sizes 9 30 90 300 --output phases.json
+    python -m benchmarks.phases --sizes 9 30 --compare phases.json
+
+With --compare, the run is checked against a previous result file and the script exits with status 1 if a phase got
+slower than the tolerance.
+"""
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import multiprocessing
+
+import numpy as np
+
+from benchmarks.common import random_feature_vectors, peak_rss_mb
+
+
+def run_size(n_train_images, n_test_images, sleep_ms, threads, seed):
+    """
+    Run all the phases for one network size, in the current process.
+
+    Returns:
+        List: one record per phase.
+    """
+    import nest
+
+    from model.network import Network
+    from model.schedule import Schedule
+
+    nest.ResetKernel()
+    nest.set_verbosity('M_ERROR')
+    rng = np.random.default_rng(seed)
+    records = []
+
+    def measure(phase, function, simulated_ms=0.0):
+        # Wall time, spikes and memory of one phase
+        spikes = nest.local_spike_counter
+        start = time.perf_counter()
+        result = function()
+        wall = time.perf_counter() - start
+
+        records.append({"n_train_images": n_train_images,
+                        "phase": phase,
+                        "wall_s": wall,
+                        "simulated_ms": simulated_ms,
+                        "real_time_factor": wall / (simulated_ms / 1000.0) if simulated_ms else None,
+                        "peak_rss_mb": peak_rss_mb(),
+                        "num_connections": nest.num_connections,
+                        "network_size": nest.network_size,
+                        "spikes": nest.local_spike_counter - spikes})
+        return result
+
+    # Build
+    net = measure('build', lambda: Network(n_train_images, kernel={"threads": threads, "seed": seed}))
+    net.connect_all_devices({name: {"voltage": False} for name in ('cx', 'in', 'tc', 're')})
+
+    # Training
+    training = Schedule()
+    for group, feature_vector in enumerate(random_feature_vectors(n_train_images, rng)):
+        training.add_training(feature_vector, group)
+    measure('training', lambda: net.run_schedule(training), training.duration)
+
+    # Retrieval
+    retrieval = Schedule()
+    for feature_vector in random_feature_vectors(n_test_images, rng):
+        retrieval.add_retrieval(feature_vector)
+    measure('retrieval', lambda: net.run_schedule(retrieval), retrieval.duration)
+
+    # Sleep
+    sleep = Schedule()
+    sleep.add_sleep(sleep_ms)
+    measure('sleep', lambda: net.run_schedule(sleep), sleep_ms)
+
+    return records
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the wall times with a baseline result file.
+
+    Returns:
+        bool: True if no phase is slower than (1 + tolerance) times the baseline.
+    """
+    reference = {(r["n_train_images"], r["phase"]): r for r in baseline["results"]}
+    ok = True
+
+    for record in results:
+        key = (record["n_train_images"], record["phase"])
+        if key not in reference:
+            continue
+
+        ratio = record["wall_s"] / max(reference[key]["wall_s"], 1e-9)
+        regression = ratio > 1.0 + tolerance
+        ok &= not regression
+        print(f"n_train_images={key[0]:5d} {key[1]:10s} {reference[key]['wall_s']:9.3f}s -> {record['wall_s']:9.3f}s "
+              f"(x{ratio:5.2f}){'  REGRESSION' if regression else ''}", file=sys.stderr)
+
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[9, 30, 90], help="Numbers of training images.")
+    parser.add_argument('--test-images', type=int, default=10, help="Images presented in the retrieval phase.")
+    parser.add_argument('--sleep-ms', type=float, default=10000.0, help="Simulated sleep duration (600000 in the paper).")
+    parser.add_argument('--threads', type=int, default=1, help="NEST threads.")
+    parser.add_argument('--seed', type=int, default=12, help="Seed of NEST and of the random feature vectors.")
+    parser.add_argument('--output', help="JSON file for the results (printed otherwise).")
+    parser.add_argument('--compare', help="Previous result file to check for regressions.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown with --compare.")
+    args = parser.parse_args(argv)
+
+    # One fresh process per size
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for n_train_images in args.sizes:
+        with context.Pool(1) as pool:
+            records = pool.apply(run_size, (n_train_images, args.test_images, args.sleep_ms, args.threads, args.seed))
+
+        for record in records:
+            print(f"n_train_images={record['n_train_images']:5d} {record['phase']:10s} wall={record['wall_s']:9.3f}s "
+                  f"rss={record['peak_rss_mb']:9.1f}MB connections={record['num_connections']:10d} "
+                  f"spikes={record['spikes']:10d}", file=sys.stderr)
+        results.extend(records)
+
+    output = {"meta": {"host": socket.gethostname(),
+                       "platform": platform.platform(),
+                       "python": platform.python_version(),
+                       "date": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       "args": vars(args)},
+              "results": results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=4)
+    else:
+        print(json.dumps(output, indent=4))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
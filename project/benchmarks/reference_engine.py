@@ -0,0 +1,163 @@
+"""
+Reference engine benchmark and agreement check: runs the same training and retrieval protocol with the NumPy
+reference engine (model.reference.ReferenceNetwork) and with NEST (model.network.Network), and compares, for every
+phase, the wall time, the mean firing rate of every population and the responses of the cx groups to the retrieved
+images.
+
+Every engine runs in its own process. Without NEST, only the reference engine runs. Run from the project directory,
+e.g.:
+
+    python -m benchmarks.reference_engine --sizes 3 9 --output reference.json
+
+The script exits with status 1 if a population rate differs between the engines by more than the tolerance.
+"""
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from benchmarks.common import random_feature_vectors, peak_rss_mb
+
+
+def run_engine(engine, n_train_images, n_test_images, seed):
+    """
+    Run the training and retrieval phases with one engine, in the current process.
+
+    Returns:
+        Dict: wall time and rates (Hz) of every population for every phase, and the retrieval responses of the cx
+              groups with shape (n_test_images, n_groups).
+    """
+    from model.analysis import population_layout, presentation_responses
+    from model.schedule import Schedule
+
+    if engine == 'nest':
+        import nest
+
+        from model.network import Network
+
+        nest.ResetKernel()
+        nest.set_verbosity('M_ERROR')
+        net = Network(n_train_images, kernel={"seed": seed})
+        now = lambda: nest.biological_time
+    else:
+        from model.reference import ReferenceNetwork
+
+        net = ReferenceNetwork(n_train_images, kernel={"seed": seed})
+        now = lambda: net.biological_time
+
+    net.connect_all_devices({name: {"voltage": False} for name in ('cx', 'in', 'tc', 're')})
+
+    # Same images for both engines
+    rng = np.random.default_rng(seed)
+    training = Schedule()
+    for group, feature_vector in enumerate(random_feature_vectors(n_train_images, rng)):
+        training.add_training(feature_vector, group)
+    retrieval = Schedule()
+    for feature_vector in random_feature_vectors(n_test_images, rng):
+        retrieval.add_retrieval(feature_vector)
+
+    result = {"engine": engine, "n_train_images": n_train_images, "phases": {}}
+
+    for phase, schedule in (('training', training), ('retrieval', retrieval)):
+        if phase == 'retrieval':
+            net.freeze_plasticity()
+
+        t0 = now()
+        counts = {name: getattr(net, f"spikes_{name}").get('n_events') for name in ('cx', 'in', 'tc', 're')}
+        start = time.perf_counter()
+        net.run_schedule(schedule)
+        wall = time.perf_counter() - start
+
+        rates = {}
+        for name in ('cx', 'in', 'tc', 're'):
+            n_spikes = getattr(net, f"spikes_{name}").get('n_events') - counts[name]
+            rates[name] = n_spikes * 1000.0 / (len(getattr(net, f"{name}_pop")) * schedule.duration)
+
+        result["phases"][phase] = {"wall_s": wall, "simulated_ms": schedule.duration, "rates": rates}
+
+    # Responses of the cx groups to the retrieved images
+    events = net.spikes_cx.get('events')
+    first_id, n_neurons = population_layout(net, 'cx')
+    result["responses"] = presentation_responses(events["senders"], events["times"], retrieval.presentation_windows() + t0,
+                                                 first_id, n_neurons).tolist()
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    return result
+
+
+def agreement(reference, nest_result, tolerance):
+    """
+    Compare the rates and responses of the two engines.
+
+    Returns:
+        bool: True if every population rate of every phase agrees within the relative tolerance.
+    """
+    ok = True
+
+    for phase, values in reference["phases"].items():
+        for name, rate in values["rates"].items():
+            rate_nest = nest_result["phases"][phase]["rates"][name]
+            difference = abs(rate - rate_nest) / max(rate_nest, 1.0)
+            ok &= difference <= tolerance
+            print(f"n_train_images={reference['n_train_images']:5d} {phase:10s} {name}: nest={rate_nest:8.2f}Hz "
+                  f"reference={rate:8.2f}Hz{'  DISAGREE' if difference > tolerance else ''}", file=sys.stderr)
+
+    # Same winning group for every retrieved image
+    responses, responses_nest = np.asarray(reference["responses"]), np.asarray(nest_result["responses"])
+    same = np.mean(responses.argmax(axis=1) == responses_nest.argmax(axis=1))
+    print(f"n_train_images={reference['n_train_images']:5d} retrieval winners: {same:.0%} identical", file=sys.stderr)
+
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 9], help="Numbers of training images.")
+    parser.add_argument('--test-images', type=int, default=5, help="Images presented in the retrieval phase.")
+    parser.add_argument('--seed', type=int, default=12, help="Seed of the engines and of the random feature vectors.")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="Allowed relative difference of the rates.")
+    parser.add_argument('--output', help="JSON file for the results (printed otherwise).")
+    args = parser.parse_args(argv)
+
+    try:
+        import nest
+        engines = ('reference', 'nest')
+    except ImportError:
+        print("NEST is not available: only the reference engine runs.", file=sys.stderr)
+        engines = ('reference',)
+
+    # One fresh process per engine and size
+    results = []
+    ok = True
+    context = multiprocessing.get_context('spawn')
+    for n_train_images in args.sizes:
+        runs = {}
+        for engine in engines:
+            with context.Pool(1) as pool:
+                runs[engine] = pool.apply(run_engine, (engine, n_train_images, args.test_images, args.seed))
+
+            for phase, values in runs[engine]["phases"].items():
+                print(f"n_train_images={n_train_images:5d} {engine:10s} {phase:10s} wall={values['wall_s']:9.3f}s "
+                      f"real_time_factor={values['wall_s'] / (values['simulated_ms'] / 1000.0):7.2f}", file=sys.stderr)
+            results.append(runs[engine])
+
+        if 'nest' in runs:
+            ok &= agreement(runs['reference'], runs['nest'], args.tolerance)
+
+    output = {"meta": {"date": time.strftime('%Y-%m-%dT%H:%M:%S'), "args": vars(args)}, "results": results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=4)
+    else:
+        print(json.dumps(output, indent=4))
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
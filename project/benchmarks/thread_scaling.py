@@ -0,0 +1,86 @@
+"""
+Thread scaling benchmark: wall time of building the network, connecting the stimulus and devices, and simulating the
+training phase, for 1..N threads and several numbers of training images.
+
+Run from the project directory, e.g.:
+
+    python -m benchmarks.thread_scaling --threads 1 2 4 8 --sizes 9 30 90 --output scaling.json
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.common import random_feature_vectors
+
+
+def run(threads, n_train_images, seed):
+    """
+    Build, connect and train a network, returning the wall time of each stage.
+    """
+    import nest
+
+    from model.network import Network
+    from model.schedule import Schedule
+
+    nest.ResetKernel()
+    nest.set_verbosity('M_ERROR')
+    rng = np.random.default_rng(seed)
+
+    # Build
+    start = time.perf_counter()
+    net = Network(n_train_images, kernel={"threads": threads, "seed": seed})
+    build = time.perf_counter() - start
+
+    # Connect stimulus and devices
+    start = time.perf_counter()
+    net.connect_all_devices({name: {"voltage": False} for name in ('cx', 'in', 'tc', 're')})
+    schedule = Schedule()
+    for group, feature_vector in enumerate(random_feature_vectors(n_train_images, rng)):
+        schedule.add_training(feature_vector, group)
+    generators = net.compile_schedule(schedule)
+    connect = time.perf_counter() - start
+
+    # Simulate the training phase
+    start = time.perf_counter()
+    nest.Simulate(schedule.duration)
+    simulate = time.perf_counter() - start
+
+    return {"threads": threads,
+            "n_train_images": n_train_images,
+            "seed": seed,
+            "build_s": build,
+            "connect_s": connect,
+            "simulate_s": simulate,
+            "simulated_ms": schedule.duration,
+            "num_connections": nest.num_connections,
+            "generators": sum(len(g) for g in generators.values())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4], help="Thread counts to run.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[9, 30], help="Numbers of training images.")
+    parser.add_argument('--seed', type=int, default=12, help="Seed of NEST and of the random feature vectors.")
+    parser.add_argument('--output', help="JSON file for the results (printed otherwise).")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n_train_images in args.sizes:
+        for threads in args.threads:
+            result = run(threads, n_train_images, args.seed)
+            results.append(result)
+            print(f"n_train_images={n_train_images:5d} threads={threads:3d} build={result['build_s']:8.3f}s "
+                  f"connect={result['connect_s']:8.3f}s simulate={result['simulate_s']:8.3f}s", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# The modules are imported from the project directory (e.g. from model.network import Network), as in the notebooks:
+# pytest puts the directory of this conftest.py on sys.path, so the tests run from any working directory.
@@ -1,14 +1,77 @@
+import os
+import json
+import hashlib
+import logging
+
 import numpy as np
-import matplotlib.pyplot as plt
 
-from skimage.feature import hog
+from concurrent.futures import ProcessPoolExecutor
+
+# Default preprocessing parameters producing the 324-wide thalamic feature vectors
+FEATURE_PARAMS = {
+    "stride": 7,                                # Step between two HOG windows (pixels)
+    "cell_size": 14,                            # Side of each HOG window (pixels)
+    "orientations": 9,                          # Orientation bins per window
+    "thresholds": (0.25, 0.50, 0.75),           # Edges of the UltraLow/MediumLow/MediumHigh/High categories
+}
+
+# Directory of the dataset files, resolved relative to this package (not to the working directory)
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Files behind each array attribute of MNIST
+DATASET_FILES = {
+    "x_train": 'x_train_data.npy',
+    "y_train": 'y_train_data.npy',
+    "x_test": 'x_test_data.npy',
+    "y_test": 'y_test_data.npy',
+    "x_train_feat_vect": 'x_train_feat_vect.npy',
+    "x_test_feat_vect": 'x_test_feat_vect.npy',
+}
+
+# Default directory of the feature cache, next to the dataset files
+FEATURE_CACHE_DIR = os.path.join(DATASET_DIR, 'feature_cache')
+
+# Increase whenever the feature computation changes, so old cache entries are not reused
+FEATURE_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def feature_params_key(params):
+    """
+    Hash of all the preprocessing parameters, used as the name of the cache entry.
+
+    :param params: Preprocessing parameters (see FEATURE_PARAMS).
+    :type: dict
+
+    Returns:
+        str: hexadecimal key of the parameters.
+    """
+    description = json.dumps({"version": FEATURE_VERSION, **params}, sort_keys=True, default=list)
+
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def _build_feature_chunk(images, params, path):
+    """
+    Worker of MNIST.build_feature_vectors: compute the bit-packed feature vectors of a chunk of images and store them in path.
+    The file is written under a temporary name and then renamed, so an interrupted run never leaves a partial chunk.
+    """
+    feature_vectors = MNIST.hog_batch(images, params["stride"], params["cell_size"], params["orientations"])
+    packed_features = MNIST.pack_features(MNIST.bin_batch(feature_vectors, params["thresholds"]))
+
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, packed_features)
+    os.replace(tmp_path, path)
+
+    return path
 
 class MNIST:
     """
         The MNIST class serves a base class to generate the MSNIT dataset to be inputed to the network.  
     """
     
-    def __init__(self):
+    def __init__(self, data_dir=DATASET_DIR):
         """
             MNIST Instantiation.
             
@@ -16,44 +79,219 @@ class MNIST:
             
             self.mnist = tf.keras.datasets.mnist # 28 x 28 pixels
             (x_train, y_train), (x_test, y_test) = self.mnist.load_data()
+
+            Nothing is read here: the arrays (x_train, y_train, x_test, y_test, x_train_feat_vect, x_test_feat_vect) are
+            opened as read-only memory maps the first time they are accessed, so a run selecting a few training images only
+            reads those rows from disk.
+
+        :param data_dir: Directory of the .npy files. Defaults to the directory of this module.
+        :type: str
         """
         
-        # Load raw files
-        self.x_train = np.load('dataset/x_train_data.npy')
-        self.y_train = np.load('dataset/y_train_data.npy')
-        self.x_test = np.load('dataset/x_test_data.npy')
-        self.y_test = np.load('dataset/y_test_data.npy')
+        # Declare paths
+        self.data_dir = data_dir
+
+        # Per-class index of the labels, built on first use by class_indices()
+        self._class_indices = {}
+
+    def __getattr__(self, name):
+        """
+        Open the dataset arrays lazily. Only called for attributes not set yet, so every array is mapped at most once.
+        """
+        if name in DATASET_FILES:
+            array = np.load(os.path.join(self.data_dir, DATASET_FILES[name]), mmap_mode='r')
+        elif name in ("x_train_feat_packed", "x_test_feat_packed"):
+            # Bit-packed feature vectors (41 bytes per image), see active_thalamic_indices()
+            array = self.pack_features(getattr(self, name.replace('_packed', '_vect')))
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        setattr(self, name, array)
+
+        return array
+
+    def class_indices(self, split='train'):
+        """
+        Per-class index of the samples, built once with a single stable sort of the labels.
+
+        :param split: 'train' or 'test'.
+        :type: str
+
+        Returns:
+            Dict: maps every label to the array of its sample indices, in increasing order.
+        """
+        assert split in ('train', 'test'), "Type 'train' or 'test'."
+
+        if split not in self._class_indices:
+            labels = np.asarray(getattr(self, f"y_{split}"))
+            order = np.argsort(labels, kind='stable')
+            classes, starts = np.unique(labels[order], return_index=True)
+            self._class_indices[split] = dict(zip(classes.tolist(), np.split(order, starts[1:])))
+
+        return self._class_indices[split]
+
+    def select_samples(self, classes, n_per_class, split='train', shuffle=False, seed=None, packed=False):
+        """
+        Select n_per_class samples of each class and return their feature vectors, without reading the raw images.
         
-        # Load feature vectors
-        self.x_train_feat_vect = np.load('dataset/x_train_feat_vect.npy')
-        self.x_test_feat_vect = np.load('dataset/x_test_feat_vect.npy')    
-    
-    def hog_transformation(self, image):
+        For example, select_samples([0, 1, 2], 3) returns the feature vectors of the first three 0, 1 and 2 of the 
+        training set, in this order.
+
+        :param classes: Labels to select, in the order of the output.
+        :type: list
+
+        :param n_per_class: Number of samples of each class.
+        :type: int
+
+        :param split: 'train' or 'test'. Defaults to 'train'.
+        :type: str
+
+        :param shuffle: If False, take the first occurrences of each class; otherwise draw them at random. Defaults to False.
+        :type: bool
+
+        :param seed: Seed of the random draw.
+        :type: int
+
+        :param packed: If True, return bit-packed feature vectors (see pack_features). Defaults to False.
+        :type: bool
+
+        Returns:
+            Tuple: the feature vectors with shape (len(classes) * n_per_class, n_features) and the sample indices.
+        """
+        # Declare variables
+        class_indices = self.class_indices(split)
+        rng = np.random.default_rng(seed)
+        selected = []
+
+        for label in classes:
+            indices = class_indices[label]
+            assert n_per_class <= len(indices), f"Only {len(indices)} samples of class {label} in the {split} set."
+
+            if shuffle:
+                selected.append(np.sort(rng.choice(indices, n_per_class, replace=False)))
+            else:
+                selected.append(indices[:n_per_class])
+
+        indices = np.concatenate(selected)
+
+        # Read only the selected rows of the memory-mapped features
+        features = np.asarray(getattr(self, f"x_{split}_feat_vect")[indices])
+
+        return (self.pack_features(features) if packed else features), indices
+
+    @staticmethod
+    def hog_batch(images, stride=7, cell_size=14, orientations=9):
+        """
+            Vectorized HOG transformation of a whole batch of images.
+
+            Every image is split in windows of cell_size x cell_size pixels taken with the given stride, and each window
+            is described by a single HOG cell (cells_per_block=(1, 1), L2-Hys block normalization). The computation
+            reproduces skimage.feature.hog window by window, but for all images and all windows at once.
+
+        :param images: Batch of grey images with shape (N, height, width), or a single (height, width) image.
+        :type: np.ndarray
+
+        :param stride: Step, in pixels, between two consecutive windows. Defaults to 7.
+        :type: int
+
+        :param cell_size: Side, in pixels, of each window. Defaults to 14.
+        :type: int
+
+        :param orientations: Number of orientation bins. Defaults to 9.
+        :type: int
+
+        Returns:
+            np.ndarray: array of shape (N, n_windows * orientations) with the concatenated window descriptors (81 values
+                        per image for 28x28 images with the default parameters).
+        """
+        # Declare variables
+        EPS = 1e-5                                                  # Same epsilon as skimage L2-Hys normalization
+        CLIP = 0.2                                                  # L2-Hys clipping value
+
+        images = np.asarray(images)
+        single_image = images.ndim == 2
+        images = (images[None] if single_image else images).astype(float, copy=False)
+
+        # Extract the windows of every image: shape (N, n_rows, n_cols, cell_size, cell_size)
+        windows = np.lib.stride_tricks.sliding_window_view(images, (cell_size, cell_size), axis=(1, 2))
+        windows = windows[:, ::stride, ::stride]
+
+        # Gradients computed inside every window, borders set to zero as in skimage
+        g_row = np.zeros(windows.shape)
+        g_col = np.zeros(windows.shape)
+        g_row[..., 1:-1, :] = windows[..., 2:, :] - windows[..., :-2, :]
+        g_col[..., :, 1:-1] = windows[..., :, 2:] - windows[..., :, :-2]
+
+        magnitude = np.hypot(g_col, g_row)
+
+        # Assign each pixel to its orientation bin [start, stop) with the same edges used by skimage. Pixels without
+        # gradient add nothing to the histogram, so their orientation is not computed (most of an MNIST digit is blank)
+        edges = 180.0 / orientations * np.arange(orientations + 1)
+        moving = magnitude > 0
+        orientation = np.rad2deg(np.arctan2(g_row[moving], g_col[moving])) % 180
+        bins = np.zeros(magnitude.shape, dtype=np.intp)
+        bins[moving] = np.searchsorted(edges, orientation, side='right') - 1
+
+        # Accumulate the magnitudes of each window pixel by pixel in single precision, as skimage does, so that the
+        # descriptors (and hence their binning) are identical to the per-window implementation
+        n_windows = windows.shape[0] * windows.shape[1] * windows.shape[2]
+        magnitude = magnitude.reshape(n_windows, -1).T
+        bins = bins.reshape(n_windows, -1).T
+        outside = bins >= orientations                              # Orientations of exactly 180 degrees belong to no bin
+        magnitude = np.where(outside, 0.0, magnitude)
+        bins = np.where(outside, 0, bins)
+
+        rows = np.arange(n_windows)
+        histogram = np.zeros((n_windows, orientations), dtype=np.float32)
+        for pixel_bins, pixel_magnitude in zip(bins, magnitude):
+            histogram[rows, pixel_bins] = histogram[rows, pixel_bins] + pixel_magnitude
+        histogram = (histogram / np.float32(cell_size * cell_size)).astype(float)
+        histogram = histogram.reshape(windows.shape[:3] + (orientations,))
+
+        # L2-Hys normalization of every (single cell) block
+        histogram /= np.sqrt(np.sum(histogram ** 2, axis=-1, keepdims=True) + EPS ** 2)
+        histogram = np.minimum(histogram, CLIP)
+        histogram /= np.sqrt(np.sum(histogram ** 2, axis=-1, keepdims=True) + EPS ** 2)
+
+        feature_vectors = histogram.reshape(len(images), -1)
+
+        return feature_vectors[0] if single_image else feature_vectors
+
+    def hog_transformation(self, image, visualize=False):
         """
             Corrected function for HOG transformation with specific stride.
 
-        Args:
-            image (_type_): _description_
-            stride (int, optional): _description_. Defaults to 7.
+        :param image: Grey image of 28x28 pixels.
+        :type: np.ndarray
+
+        :param visualize: If True, also build the HOG image of the windows (slow, only for plotting). Defaults to False.
+        :type: bool
 
         Returns:
-            _type_: _description_
+            Tuple: the feature vector (81 values) and the HOG image, which is None unless visualize is True.
         """
         # Declare variables
         stride = 7
-        feature_vectors = []
+        cell_size = 14
 
-        # Size of the image, cells, and blocks
+        # Compute the feature vector with the vectorized extractor
+        feature_vector = self.hog_batch(image, stride=stride, cell_size=cell_size)
+
+        if not visualize:
+            return feature_vector, None
+
+        # Only needed for the HOG image, so imported here
+        from skimage.feature import hog
+
+        # Overlay the HOG image of each window on the image grid
         height, width = image.shape
-        cell_size = 14
+        hog_image = np.zeros((height, width))
 
-        # Iterate over the image with the given stride
         for y in range(0, height - cell_size + 1, stride):
             for x in range(0, width - cell_size + 1, stride):
                 cell_region = image[y:y+cell_size, x:x+cell_size]
 
-                # Calculate HOG features for the cell
-                fd, hog_image = hog(
+                _, cell_hog_image = hog(
                     cell_region,
                     orientations=9,
                     pixels_per_cell=(cell_size, cell_size),
@@ -62,36 +300,95 @@ class MNIST:
                     feature_vector=True
                 )
 
-                feature_vectors.append(fd)
-
-        # Concatenate all feature vectors
-        feature_vector = np.concatenate(feature_vectors)
-
-        # print("Feature vector:", feature_vector)
-        # print("Feature vector length:", len(feature_vector))
-        # print("Feature descriptor:", fd)
-        # print("Feature descriptor length:", len(fd))
+                hog_image[y:y+cell_size, x:x+cell_size] = np.maximum(hog_image[y:y+cell_size, x:x+cell_size], cell_hog_image)
 
         return feature_vector, hog_image
     
-    def bin_feature_values(self, feature_vector):
+    @staticmethod
+    def bin_batch(feature_vectors, thresholds=(0.25, 0.50, 0.75)):
+        '''
+        Vectorized binning of a batch of feature vectors: every value is one-hot encoded in len(thresholds) + 1
+        categories (UltraLow, MediumLow, MediumHigh, High by default).
+
+        :param feature_vectors: HOG feature vectors with shape (N, n_values), or a single vector.
+        :type: np.ndarray
+
+        :param thresholds: Increasing edges between the categories.
+        :type: tuple
+
+        Returns:
+            np.ndarray: uint8 array of shape (N, n_values * n_categories), e.g. (N, 324) for the 81 HOG values.
+        '''
+        feature_vectors = np.asarray(feature_vectors)
+        n_categories = len(thresholds) + 1
+
+        # Category of each value: the number of thresholds lower or equal to it
+        categories = np.searchsorted(np.asarray(thresholds, dtype=float), feature_vectors, side='right')
+
+        return (categories[..., None] == np.arange(n_categories)).astype(np.uint8).reshape(feature_vectors.shape[:-1] + (-1,))
+
+    @staticmethod
+    def bin_feature_values(feature_vector, thresholds=(0.25, 0.50, 0.75)):
         '''
         Binning the feature values into four categories
+
+        :param thresholds: Increasing edges between the categories (UltraLow, MediumLow, MediumHigh, High by default).
+        :type: tuple
+        '''
+        return MNIST.bin_batch(feature_vector, thresholds)     # flattening preserves properties but in 1-dimension array
+
+    @staticmethod
+    def pack_features(binned_features):
         '''
+        Bit-pack binary feature vectors: the 324 thalamic inputs of an image take 41 bytes instead of 324 integers.
 
-        binned_vector = []
+        :param binned_features: Binary feature vectors with shape (N, n_features), or a single vector.
+        :type: np.ndarray
 
-        for value in feature_vector:
-            if value < 0.25:
-                binned_vector.append([1, 0, 0, 0])  # UltraLow
-            elif value < 0.50:
-                binned_vector.append([0, 1, 0, 0])  # MediumLow
-            elif value < 0.75:
-                binned_vector.append([0, 0, 1, 0])  # MediumHigh
-            else:
-                binned_vector.append([0, 0, 0, 1])  # High
+        Returns:
+            np.ndarray: uint8 array of shape (N, ceil(n_features / 8)).
+        '''
+        return np.packbits(np.asarray(binned_features, dtype=bool), axis=-1)
+
+    @staticmethod
+    def unpack_features(packed_features, n_features=324):
+        '''
+        Inverse of pack_features.
+
+        :param packed_features: Bit-packed feature vectors with shape (N, n_bytes), or a single vector.
+        :type: np.ndarray
+
+        :param n_features: Length of the binary feature vectors. Defaults to 324, the size of the tc population.
+        :type: int
+
+        Returns:
+            np.ndarray: uint8 array of shape (N, n_features) with 0/1 values.
+        '''
+        return np.unpackbits(packed_features, axis=-1, count=n_features)
+
+    @staticmethod
+    def active_thalamic_indices(packed_features, n_features=324):
+        '''
+        Indices of the thalamic (tc) neurons receiving the training signal, read directly from bit-packed features.
+
+        :param packed_features: Bit-packed feature vector of one image (n_bytes,) or of a batch of images (N, n_bytes).
+        :type: np.ndarray
+
+        :param n_features: Length of the binary feature vectors. Defaults to 324, the size of the tc population.
+        :type: int
+
+        Returns:
+            np.ndarray or list: the indices of the active tc neurons for one image, or a list with one array per image.
+        '''
+        packed_features = np.asarray(packed_features, dtype=np.uint8)
+        binned_features = np.unpackbits(packed_features, axis=-1, count=n_features)
+
+        if binned_features.ndim == 1:
+            return np.flatnonzero(binned_features)
+
+        images, indices = np.nonzero(binned_features)
 
-        return np.array(binned_vector).flatten()    # flattening preserves properties but in 1-dimension array
+        return np.split(indices, np.cumsum(np.bincount(images, minlength=len(binned_features)))[:-1])
     
     def plot_images(self, original_image, hog_image):
         """
@@ -101,6 +398,8 @@ class MNIST:
             original_image (_type_): _description_
             hog_image (_type_): _description_
         """
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(10, 5))
 
         plt.subplot(1, 2, 1)
@@ -113,37 +412,122 @@ class MNIST:
 
         plt.show()
         
-    def process_and_store(self, x):
+    def process_and_store(self, x, chunk_size=2000, stride=7, cell_size=14, orientations=9, thresholds=(0.25, 0.50, 0.75)):
         '''
         Process and store binned features vectors for training data
+
+        :param x: Images with shape (N, 28, 28).
+        :type: np.ndarray
+
+        :param chunk_size: Number of images transformed at once, bounding the memory of the vectorized HOG. Defaults to 2000.
+        :type: int
+
+        The remaining parameters are the HOG (stride, cell_size, orientations) and binning (thresholds) parameters.
         '''
 
         binned_features = []
 
-        for image in x:
-            feature_vector, hog_image = self.hog_transformation(image) # Apply HOG transformation to each image
+        for start in range(0, len(x), chunk_size):
+            feature_vectors = self.hog_batch(x[start:start+chunk_size], stride, cell_size, orientations)   # Apply HOG transformation to a chunk of images
 
-            binned_feature = self.bin_feature_values(feature_vector)   # Bin the feature vector values
+            binned_features.append(self.bin_batch(feature_vectors, thresholds))                 # Bin the feature vector values
 
-            binned_features.append(binned_feature)                # Store the binned feature vector
+        binned_features = np.concatenate(binned_features)                                       # Join the chunks in one numpy array
 
-            # plot_images(image, hog_image)                       # Plot original and HOG transformed images
+        return binned_features
+
+    def build_feature_vectors(self, x, name, chunk_size=2000, n_workers=None, cache_dir=FEATURE_CACHE_DIR, packed=False, **params):
+        '''
+        Feature-build stage: compute the binned feature vectors of x in a process pool and cache them on disk.
 
-        binned_features = np.array(binned_features)               # Convert list to numpy array
+        The images are split in chunks of chunk_size, and each chunk is stored in
+        cache_dir/<params key>/<name>-<data key>/chunk_<start>_<stop>.npy, where the params key is a hash of all the
+        preprocessing parameters and the data key a hash of the images. Chunks already in the cache are loaded instead of
+        recomputed, so sweeping the parameters only costs CPU for the configurations not built yet. The data key covers
+        the dtype and shape of the images as well as their bytes.
 
-        return binned_features
+        :param x: Images with shape (N, 28, 28).
+        :type: np.ndarray
 
-        feature_x_train = process_and_store(x_train).copy()
-        feature_x_test = process_and_store(x_test).copy()
+        :param name: Name of the image set in the cache, e.g. 'x_train' or 'x_test'.
+        :type: str
 
-        # print(feature_x_train)
-        # print(feature_x_test)
+        :param chunk_size: Number of images per chunk (and per worker task). Defaults to 2000.
+        :type: int
 
-        # plt.show()
+        :param n_workers: Number of worker processes, os.cpu_count() when None. With 1, chunks are built in this process.
+        :type: int
 
+        :param cache_dir: Root directory of the feature cache. Defaults to dataset/feature_cache.
+        :type: str
 
+        :param packed: If True, return the bit-packed vectors as stored in the cache (see pack_features). Defaults to False.
+        :type: bool
+
+        :param params: Preprocessing parameters overriding FEATURE_PARAMS (stride, cell_size, orientations, thresholds).
+
+        Returns:
+            np.ndarray: array of shape (N, n_features) with the binned feature vectors, or (N, n_bytes) if packed; N may
+                        be 0.
+        '''
+        # Assert arguments are valid
+        unknown = set(params) - set(FEATURE_PARAMS)
+        assert not unknown, f"Unknown preprocessing parameters: {sorted(unknown)}."
+        assert chunk_size > 0, "Type a chunk size higher than 0."
+
+        # Declare variables
+        params = {**FEATURE_PARAMS, **params}
+        params["thresholds"] = tuple(params["thresholds"])
+        x = np.ascontiguousarray(x)
+        n_windows = ((x.shape[1] - params["cell_size"]) // params["stride"] + 1) * ((x.shape[2] - params["cell_size"]) // params["stride"] + 1)
+        n_features = n_windows * params["orientations"] * (len(params["thresholds"]) + 1)
+
+        # No image: nothing to build or cache
+        if len(x) == 0:
+            packed_features = np.zeros((0, (n_features + 7) // 8), dtype=np.uint8)
+            return packed_features if packed else self.unpack_features(packed_features, n_features)
+
+        # Hash of the images, with their dtype and shape so that equal bytes of different arrays do not collide
+        data_hash = hashlib.sha1(repr((x.dtype.str, x.shape)).encode())
+        data_hash.update(x)
+        data_key = data_hash.hexdigest()[:16]
+        params_dir = os.path.join(cache_dir, feature_params_key(params))
+        chunk_dir = os.path.join(params_dir, f"{name}-{data_key}")
+        os.makedirs(chunk_dir, exist_ok=True)
+
+        # Record the parameters of the cache entry
+        params_file = os.path.join(params_dir, 'params.json')
+        if not os.path.exists(params_file):
+            with open(params_file, 'w') as f:
+                json.dump({"version": FEATURE_VERSION, **params}, f, indent=4)
+
+        # Find the chunks not built yet
+        chunk_paths = []
+        missing = []
+        for start in range(0, len(x), chunk_size):
+            stop = min(start + chunk_size, len(x))
+            path = os.path.join(chunk_dir, f"chunk_{start:06d}_{stop:06d}.npy")
+            chunk_paths.append(path)
+            if not os.path.exists(path):
+                missing.append((start, stop, path))
+
+        # Build them, in parallel if asked to
+        if missing:
+            logger.info(f"Building {len(missing)} of {len(chunk_paths)} feature chunks for {name}...")
+            if n_workers == 1 or len(missing) == 1:
+                for start, stop, path in missing:
+                    _build_feature_chunk(x[start:stop], params, path)
+            else:
+                with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                    futures = [executor.submit(_build_feature_chunk, x[start:stop], params, path) for start, stop, path in missing]
+                    for future in futures:
+                        future.result()
+            logger.info("...done.")
 
+        # Gather the chunks
+        packed_features = np.concatenate([np.load(path) for path in chunk_paths])
 
-     
+        if packed:
+            return packed_features
 
-        
\ No newline at end of file
+        return self.unpack_features(packed_features, n_features)
@@ -0,0 +1,263 @@
+"""
+Headless experiment runner: runs the whole protocol of the notebooks from a JSON configuration, without Jupyter,
+
+    select data -> build -> train -> retrieve -> sleep -> retrieve -> classify
+
+and writes the results to the output directory: the configuration used, the log, the trained and post-sleep
+checkpoints, the retrieval spike counts (responses.npz) and the classification report (report.json). Heavy modules
+(NEST) are only imported by the stages that need them. Run from the project directory, e.g.:
+
+    python experiment.py config.json
+    python experiment.py config.json --output results/run-2 --set sleep.duration=60000 --set data.seed=3
+
+Every key of the configuration is optional, see EXPERIMENT_DEFAULTS.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+
+logger = logging.getLogger('experiment')
+
+# Default configuration, overridden key by key by the configuration file and the --set options
+EXPERIMENT_DEFAULTS = {
+    "output": 'results',
+    "data": {
+        "classes": list(range(10)),         # Digits of the experiment
+        "train_per_class": 1,               # Training images per class, one group of 20 cx neurons each
+        "test_per_class": 10,               # Test images per class
+        "shuffle": False,                   # Draw the images at random instead of taking the first ones
+        "seed": None,                       # Seed of the random draw
+    },
+    "network": {
+        "kernel": {},                       # Kernel configuration, see Network(kernel=...)
+        "connectivity": None,               # Connectivity of the plastic projections, see Network(connectivity=...)
+        "max_memory_mb": None,              # Fail before building if the estimated memory is larger
+    },
+    "training": {
+        "inhibit": True,                    # Inhibitory signal to the in population from the second image on
+    },
+    "sleep": {
+        "duration": 600000.0,               # Maximum sleep duration (ms); 0 skips the sleep and the second retrieval
+        "chunk": 10000.0,                   # Duration of the chunks between convergence checks (ms)
+        "tolerance": 0.0,                   # Relative cx-cx weight change to stop early; 0 always sleeps the full duration
+    },
+    "retrieval": {
+        "n_workers": 1,                     # Processes of the retrieval, see evaluate_checkpoint
+        "n_replicas": 1,                    # Replicas of the network per process, see Replicas
+    },
+}
+
+
+def merge(defaults, config):
+    """
+    Configuration with the keys of config replacing the ones of defaults, nested dicts merged key by key.
+    """
+    unknown = set(config) - set(defaults)
+    assert not unknown, f"Unknown configuration keys: {sorted(unknown)}."
+
+    return {key: merge(value, config.get(key, {})) if isinstance(value, dict) and value and key in config
+            else config.get(key, value) for key, value in defaults.items()}
+
+
+def parse_overrides(overrides):
+    """
+    Nested configuration from 'section.key=value' strings, the values being parsed as JSON when possible.
+    """
+    config = {}
+
+    for override in overrides:
+        path, value = override.split('=', 1)
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+
+        *sections, key = path.split('.')
+        node = config
+        for section in sections:
+            node = node.setdefault(section, {})
+        node[key] = value
+
+    return config
+
+
+def select_data(config):
+    """
+    Stage 1: feature vectors and labels of the training and test images, read from the precomputed features.
+    """
+    from dataset.dataclass import MNIST
+
+    mnist = MNIST()
+    data = {}
+
+    for split, n_per_class in (('train', config["train_per_class"]), ('test', config["test_per_class"])):
+        features, indices = mnist.select_samples(config["classes"], n_per_class, split, config["shuffle"], config["seed"])
+        data[split] = (features, np.asarray(getattr(mnist, f"y_{split}")[indices]))
+
+    logger.info(f"Selected {len(data['train'][0])} training and {len(data['test'][0])} test images.")
+
+    return data
+
+
+def build(n_train_images, config):
+    """
+    Stage 2: the network, in a fresh NEST kernel.
+    """
+    import nest
+
+    from model.network import Network
+
+    nest.ResetKernel()
+    nest.set_verbosity('M_ERROR')
+
+    return Network(n_train_images, kernel=config["kernel"], connectivity=config["connectivity"],
+                   max_memory_mb=config["max_memory_mb"])
+
+
+def train(net, feature_vectors, config):
+    """
+    Stage 3: one presentation per training image, each encoded by its own group of 20 cx neurons.
+    """
+    from model.schedule import Schedule
+
+    schedule = Schedule()
+    for group, feature_vector in enumerate(feature_vectors):
+        schedule.add_training(feature_vector, group, inhibit=config["inhibit"] and group > 0)
+
+    net.run_schedule(schedule)
+
+
+def retrieve(checkpoint, feature_vectors, network_config, config):
+    """
+    Stages 4 and 6: retrieval of the test images from a checkpoint, with the plasticity frozen.
+
+    Returns:
+        np.ndarray: spike counts of every cx neuron, with shape (n_images, cx_n).
+    """
+    from model.evaluation import evaluate_checkpoint
+
+    network_kwargs = {"kernel": network_config["kernel"], "max_memory_mb": network_config["max_memory_mb"]}
+
+    return evaluate_checkpoint(checkpoint, feature_vectors, config["n_workers"], group_size=1,
+                               network_kwargs=network_kwargs, n_replicas=config["n_replicas"])
+
+
+def sleep(net, config):
+    """
+    Stage 5: sleep-like slow oscillations, stopped early if the weights converge (see Network.sleep_until_converged).
+    """
+    return net.sleep_until_converged(config["duration"], min(config["chunk"], config["duration"]), config["tolerance"])
+
+
+def classify(responses, labels, group_labels, n_classes):
+    """
+    Stage 7: supervised and unsupervised readouts of every retrieval.
+
+    Returns:
+        Dict: accuracy and confusion matrix of every readout of every retrieval.
+    """
+    from model.readout import classification_report
+
+    report = {}
+    for name, counts in responses.items():
+        result = classification_report(counts, labels, group_labels, n_classes)
+        report[name] = {readout: {"accuracy": values["accuracy"], "confusion": values["confusion"].tolist()}
+                        for readout, values in result.items()}
+        logger.info(f"{name}: supervised accuracy {result['supervised']['accuracy']:.1%}, "
+                    f"unsupervised accuracy {result['unsupervised']['accuracy']:.1%}.")
+
+    return report
+
+
+def run(config):
+    """
+    Run the whole pipeline and write the results to config['output'].
+
+    Returns:
+        Dict: the classification report.
+    """
+    # Declare variables
+    output = config["output"]
+    os.makedirs(output, exist_ok=True)
+    timings = {}
+
+    with open(os.path.join(output, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+
+    def stage(name, function, *args):
+        logger.info(f"Stage {name}...")
+        start = time.perf_counter()
+        result = function(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    # Data and network
+    data = stage('select_data', select_data, config["data"])
+    train_features, train_labels = data["train"]
+    test_features, test_labels = data["test"]
+    net = stage('build', build, len(train_features), config["network"])
+
+    # Training
+    stage('train', train, net, train_features, config["training"])
+    checkpoints = {"pre_sleep": os.path.join(output, 'trained.npz')}
+    net.save_checkpoint(checkpoints["pre_sleep"])
+
+    # Sleep
+    if config["sleep"]["duration"] > 0:
+        sleep_report = stage('sleep', sleep, net, config["sleep"])
+        checkpoints["post_sleep"] = os.path.join(output, 'slept.npz')
+        net.save_checkpoint(checkpoints["post_sleep"])
+    else:
+        sleep_report = None
+
+    # Retrievals, from the checkpoints, and classification
+    responses = {name: stage(f"retrieve_{name}", retrieve, path, test_features, config["network"], config["retrieval"])
+                 for name, path in checkpoints.items()}
+    np.savez_compressed(os.path.join(output, 'responses.npz'), labels=test_labels, group_labels=train_labels, **responses)
+
+    report = stage('classify', classify, responses, test_labels, train_labels, max(config["data"]["classes"]) + 1)
+    report["sleep"] = sleep_report
+    report["timings"] = timings
+
+    with open(os.path.join(output, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=4)
+
+    logger.info(f"Results written to {output}.")
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('config', nargs='?', help="JSON configuration file (defaults only when omitted).")
+    parser.add_argument('--output', help="Output directory, overriding the configuration.")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override one key, e.g. sleep.duration=60000 (repeatable).")
+    args = parser.parse_args(argv)
+
+    # Configuration: defaults < file < command line
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    config = merge(EXPERIMENT_DEFAULTS, config)
+    config = merge(config, parse_overrides(args.set))
+    if args.output:
+        config["output"] = args.output
+
+    # Log to the console and to the output directory
+    os.makedirs(config["output"], exist_ok=True)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s',
+                        handlers=[logging.StreamHandler(sys.stderr),
+                                  logging.FileHandler(os.path.join(config["output"], 'experiment.log'))])
+
+    run(config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import numpy as np
+
+# All the functions work on spike arrays as returned by the spike recorders (senders, times), e.g. from
+# net.spikes_cx.get("events") or from the chunks of Network.read_recording(). Counts are additive, so chunked recordings
+# are analysed by summing the results of every chunk (see sum_chunks).
+
+
+def population_layout(net, name='cx'):
+    """
+    First node id and size of a population of the network. Populations are created in one block, so their node ids are
+    contiguous; for a cx population grown with Network.add_groups, renumber the senders with contiguous_senders first.
+
+    :param net: Thalamo-cortical network.
+    :type: Network
+
+    :param name: Population ('cx', 'in', 'tc' or 're'). Defaults to 'cx'.
+    :type: str
+
+    Returns:
+        Tuple: the first node id and the number of neurons.
+    """
+    population = getattr(net, f"{name}_pop")
+
+    return population[0].get('global_id'), len(population)
+
+
+def node_indices(population, node_ids):
+    """
+    Indices within a population of the given node ids. Unlike node_ids - first_id, it also holds for populations grown
+    after their creation (see Network.add_groups), whose node ids are not contiguous.
+
+    :param population: Population, with its node ids in increasing order.
+    :type: NodeCollection
+
+    :param node_ids: Node ids, e.g. the senders of a recorder.
+    :type: np.ndarray
+
+    Returns:
+        np.ndarray: the indices, -1 for the node ids outside the population.
+    """
+    ids = np.asarray(population.tolist(), dtype=np.int64)
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    index = np.minimum(np.searchsorted(ids, node_ids), len(ids) - 1)
+
+    return np.where(ids[index] == node_ids, index, -1)
+
+
+def contiguous_senders(net, name, senders):
+    """
+    Senders of a grown population renumbered as first_id + index, so that the functions of this module work with
+    population_layout(). Spikes of other populations get the sender -1.
+
+    Returns:
+        np.ndarray: the renumbered senders.
+    """
+    population = getattr(net, f"{name}_pop")
+    index = node_indices(population, senders)
+
+    return np.where(index >= 0, population[0].get('global_id') + index, -1)
+
+
+def neuron_spike_counts(senders, first_id, n_neurons):
+    """
+    Number of spikes of every neuron of a population.
+
+    :param senders: Node ids of the spikes.
+    :type: np.ndarray
+
+    :param first_id: Node id of the first neuron of the population.
+    :type: int
+
+    :param n_neurons: Size of the population.
+    :type: int
+
+    Returns:
+        np.ndarray: counts with shape (n_neurons,); spikes of other populations are ignored.
+    """
+    index = np.asarray(senders, dtype=np.int64) - first_id
+    index = index[(index >= 0) & (index < n_neurons)]
+
+    return np.bincount(index, minlength=n_neurons)
+
+
+def group_spike_counts(senders, first_id, n_neurons, group_size=20):
+    """
+    Number of spikes of every group of group_size neurons (the 20-neuron cx groups encoding each training image).
+
+    Returns:
+        np.ndarray: counts with shape (n_neurons // group_size,).
+    """
+    return neuron_spike_counts(senders, first_id, n_neurons).reshape(-1, group_size).sum(axis=1)
+
+
+def spike_matrix(senders, times, first_id, n_neurons, t_start, t_stop, bin_size=1.0):
+    """
+    Binned spike matrix of a population: spikes of every neuron in every time bin of [t_start, t_stop).
+
+    Returns:
+        np.ndarray: counts with shape (n_neurons, n_bins).
+    """
+    n_bins = int(np.ceil((t_stop - t_start) / bin_size))
+    index = np.asarray(senders, dtype=np.int64) - first_id
+    bins = np.floor((np.asarray(times, dtype=float) - t_start) / bin_size).astype(np.int64)
+
+    keep = (index >= 0) & (index < n_neurons) & (bins >= 0) & (bins < n_bins)
+
+    return np.bincount(index[keep] * n_bins + bins[keep], minlength=n_neurons * n_bins).reshape(n_neurons, n_bins)
+
+
+def population_rate(senders, times, first_id, n_neurons, t_start, t_stop, bin_size=10.0):
+    """
+    Population rate histogram: mean firing rate of the population in every time bin of [t_start, t_stop).
+
+    Returns:
+        Tuple: the left edges of the bins (ms) and the rates (Hz).
+    """
+    counts = spike_matrix(senders, times, first_id, n_neurons, t_start, t_stop, bin_size).sum(axis=0)
+
+    return t_start + bin_size * np.arange(len(counts)), counts * 1000.0 / (bin_size * n_neurons)
+
+
+def group_rates(senders, times, first_id, n_neurons, t_start, t_stop, bin_size=10.0, group_size=20):
+    """
+    Firing-rate time series of every group of group_size neurons.
+
+    Returns:
+        Tuple: the left edges of the bins (ms) and the rates (Hz) with shape (n_groups, n_bins).
+    """
+    counts = spike_matrix(senders, times, first_id, n_neurons, t_start, t_stop, bin_size)
+    counts = counts.reshape(-1, group_size, counts.shape[1]).sum(axis=1)
+
+    return t_start + bin_size * np.arange(counts.shape[1]), counts * 1000.0 / (bin_size * group_size)
+
+
+def presentation_responses(senders, times, windows, first_id, n_neurons, group_size=20):
+    """
+    Response of every group of neurons to every presentation: number of spikes of each group within each window.
+
+    :param windows: Non-overlapping (start, stop) windows, e.g. Schedule.presentation_windows() shifted to the start
+                    time of the schedule.
+    :type: np.ndarray
+
+    Returns:
+        np.ndarray: counts with shape (n_windows, n_neurons // group_size).
+    """
+    windows = np.asarray(windows, dtype=float).reshape(-1, 2)
+    order = np.argsort(windows[:, 0])
+    starts, stops = windows[order, 0], windows[order, 1]
+    n_groups = n_neurons // group_size
+
+    # Window of every spike
+    times = np.asarray(times, dtype=float)
+    window = np.searchsorted(starts, times, side='right') - 1
+    group = (np.asarray(senders, dtype=np.int64) - first_id) // group_size
+
+    keep = (window >= 0) & (group >= 0) & (group < n_groups)
+    keep[keep] &= times[keep] < stops[window[keep]]
+
+    counts = np.bincount(window[keep] * n_groups + group[keep], minlength=len(windows) * n_groups).reshape(-1, n_groups)
+
+    # Back to the order of the windows given
+    responses = np.empty_like(counts)
+    responses[order] = counts
+
+    return responses
+
+
+def sum_chunks(function, chunks, *args, **kwargs):
+    """
+    Apply a counting function to every chunk of a chunked recording (see Network.read_recording) and sum the results.
+    For the functions returning (bins, values), the values are summed.
+
+    :param function: One of the functions of this module, called as function(chunk['senders'], [chunk['times'],] ...).
+    :type: function
+
+    Returns:
+        np.ndarray or Tuple: the summed result.
+    """
+    total = None
+    bins = None
+
+    for chunk in chunks:
+        if function in (neuron_spike_counts, group_spike_counts):
+            result = function(chunk["senders"], *args, **kwargs)
+        else:
+            result = function(chunk["senders"], chunk["times"], *args, **kwargs)
+
+        if isinstance(result, tuple):
+            bins, result = result
+
+        total = result if total is None else total + result
+
+    return total if bins is None else (bins, total)
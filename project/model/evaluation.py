@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _evaluate_chunk(checkpoint, feature_vectors, group_size, network_kwargs, n_replicas=1):
+    """
+    Worker of evaluate_checkpoint: restore the trained network in a fresh NEST kernel (n_replicas times, see Replicas),
+    present the images with the awake parameters and the plasticity frozen and count the spikes of every cx group
+    during every presentation.
+    """
+    # Imported here so that every worker process starts its own NEST kernel
+    import nest
+
+    from .replicas import Replicas
+
+    nest.ResetKernel()
+    nest.set_verbosity('M_ERROR')
+
+    # Restore the trained network and run the retrieval of all the images in a single simulation
+    replicas = Replicas(checkpoint, min(n_replicas, max(len(feature_vectors), 1)), **network_kwargs)
+
+    return replicas.retrieve(feature_vectors, group_size)
+
+
+def evaluate_checkpoint(checkpoint, feature_vectors, n_workers=None, group_size=20, network_kwargs=None, n_replicas=1):
+    """
+    Process-parallel retrieval of a test set from a trained network saved with Network.save_checkpoint().
+
+    The images are split across n_workers processes; each one loads the checkpoint in its own NEST kernel, freezes the
+    plasticity and runs the retrieval of its images independently. The per-image spike counts are merged in the order
+    of the feature vectors. With n_replicas > 1, every worker also batches its images across replicas of the network in
+    its kernel (see Replicas), which keeps its threads busy.
+
+    :param checkpoint: Checkpoint file of the trained network.
+    :type: str
+
+    :param feature_vectors: Binary feature vectors of the test images, with shape (n_images, 324).
+    :type: np.ndarray
+
+    :param n_workers: Number of worker processes, os.cpu_count() when None.
+    :type: int
+
+    :param group_size: Neurons per counted group: 20 for the cx groups (default), 1 for per-neuron counts.
+    :type: int
+
+    :param network_kwargs: Other arguments of the Network creation, e.g. {"kernel": {"threads": 4}}.
+    :type: dict
+
+    :param n_replicas: Replicas of the network per worker. Defaults to 1.
+    :type: int
+
+    Returns:
+        np.ndarray: spike counts with shape (n_images, cx_n // group_size).
+    """
+    # Declare variables
+    feature_vectors = np.asarray(feature_vectors)
+
+    # No image: no worker to start, the size of the cx population is read from the checkpoint
+    if len(feature_vectors) == 0:
+        with np.load(checkpoint) as saved:
+            cx_n = json.loads(str(saved["meta"]))["sizes"]["cx"]
+        return np.zeros((0, cx_n // group_size), dtype=np.int64)
+
+    n_workers = min(n_workers or multiprocessing.cpu_count(), len(feature_vectors))
+    chunks = np.array_split(np.arange(len(feature_vectors)), n_workers)
+
+    # Start the workers with spawn, so that no NEST kernel state is inherited from this process
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(_evaluate_chunk, checkpoint, feature_vectors[chunk], group_size, network_kwargs or {}, n_replicas)
+                   for chunk in chunks]
+
+        return np.concatenate([future.result() for future in futures])
@@ -0,0 +1,27 @@
+import importlib
+
+
+class LazyModule:
+    """
+        Stand-in for a heavy module (e.g. nest, which starts its kernel and prints its banner when imported), imported at
+        its first use instead of at the import of the modules that need it:
+
+            nest = LazyModule('nest')
+            nest.Create(...)            # nest is imported here
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def _module(self):
+        # importlib caches the module in sys.modules, so it is only imported once
+        return importlib.import_module(self._name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._module(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._module(), attribute, value)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
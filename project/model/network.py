@@ -1,4 +1,43 @@
-import nest
+import json
+import numbers
+import logging
+
+from contextlib import nullcontext
+
+import numpy as np
+
+from .analysis import node_indices
+from .lazy import LazyModule
+from .parameters import (RECORDING_DEFAULTS, PLASTIC_PROJECTIONS, CX_GROUP_SIZE, POPULATION_SIZES,
+                         connectivity_specs, expected_indegree, estimate_network)
+from .profiling import profiled
+from .recordings import device_files, read_chunks
+
+# Imported at its first use, see LazyModule
+nest = LazyModule('nest')
+
+logger = logging.getLogger(__name__)
+
+# Neuron state variables and parameters stored in checkpoints, see Network.save_checkpoint()
+CHECKPOINT_STATE = ('V_m', 'w', 'g_ex', 'dg_ex', 'g_in', 'dg_in')
+CHECKPOINT_PARAMS = ('b',)
+
+# Synapse properties stored in checkpoints: plastic (STDP) and static synapses. The presynaptic STDP trace (Kplus) is
+# not a connection property of stdp_synapse, so it cannot be stored
+CHECKPOINT_PLASTIC = ('weight', 'alpha')
+CHECKPOINT_STATIC = ('weight',)
+
+# Synapse properties restored by Network.reset(), in addition to the checkpoint ones
+RESET_PLASTIC = CHECKPOINT_PLASTIC + ('lambda',)
+
+# Kernel configuration accepted by Network(kernel=...), with the corresponding NEST kernel attributes
+KERNEL_OPTIONS = {
+    "threads": 'local_num_threads',             # Threads per MPI process
+    "seed": 'rng_seed',                         # Seed of the NEST random number generators
+    "resolution": 'resolution',                 # Simulation step (ms)
+    "virtual_processes": 'total_num_virtual_procs',     # Total number of virtual processes (threads x MPI processes)
+}
+
 
 class Network:
     """
@@ -6,7 +45,8 @@ class Network:
     """
     
     def __init__(
-        self, n_train_images
+        self, n_train_images, weight_tracking='summary', tracked_neurons=10, kernel=None, profiler=None,
+        connectivity=None, max_memory_mb=None, connections=None, store_states=False
     ):
         """
         Network creation
@@ -19,9 +59,67 @@ class Network:
         
         :param cx_population: Size of the pyramidal neuron (cx) population.
         :type cx_population: int        
-        """
         
+        :param weight_tracking: How the weights of the STDP synapses are tracked:
+                                'summary' (default): no weight recorder, summary statistics are taken at fixed intervals 
+                                                     with simulate_tracked() (see weight_summary);
+                                'sampled': weight recorders restricted to the synapses between tracked_neurons pre and 
+                                           tracked_neurons post neurons of each projection;
+                                'full': weight recorders on every synapse, one record per presynaptic spike (debug only, 
+                                        it is the biggest memory sink of the sleep phase).
+        :type weight_tracking: str
+        
+        :param tracked_neurons: Number of pre and post neurons of each projection in the 'sampled' mode. Defaults to 10.
+        :type tracked_neurons: int
+        
+        :param kernel: Kernel configuration, with the keys of KERNEL_OPTIONS, e.g. {"threads": 4, "seed": 12}. It is applied
+                       before any node is created, so it requires a fresh kernel (nest.ResetKernel()). For a given seed 
+                       and number of virtual processes, runs are reproducible.
+        :type kernel: dict
+        
+        :param profiler: Opt-in instrumentation: if given, the construction steps, the Network methods and the simulation 
+                         phases are timed with their kernel statistics in profiler.trace.
+        :type profiler: Profiler
+
+        :param connectivity: Connectivity of the plastic projections cx -> cx, cx -> tc and tc -> cx (see
+                             connectivity_specs). Defaults to all-to-all, where cx -> cx grows as (20 * n_train_images)^2.
+                             With sparse rules, the initial and max weights are scaled by n_pre / expected in-degree so
+                             that the input drive of every neuron stays comparable.
+        :type connectivity: dict
+
+        :param max_memory_mb: If given, fail before creating anything when the estimated memory (see estimate_network)
+                              exceeds it.
+        :type max_memory_mb: float
+
+        :param connections: Explicit (sources, targets) of plastic projections, as indices within the pre and post
+                            populations; used by from_checkpoint() to rebuild sparse connectivity.
+        :type connections: dict
+
+        :param store_states: Store the 'initial' state at the creation and the 'trained' state after every training 
+                             phase of run_schedule(), to restore them with reset(). Every state is a copy of all the 
+                             synapses, so it is off by default: store_state() can also be called explicitly.
+        :type store_states: bool
+        """
+
         assert isinstance(n_train_images, int), "No size of the pyramidal neuron (cx) population provided."
+        assert weight_tracking in ('summary', 'sampled', 'full'), "Type 'summary', 'sampled' or 'full'."
+
+        # Estimate the size of the network before building it
+        self.connectivity = connectivity_specs(connectivity)
+        self.estimate = estimate_network(n_train_images, self.connectivity)
+        logger.info(f"Estimated network: {self.estimate['plastic_synapses']} plastic and "
+                    f"{self.estimate['static_synapses']} static synapses, {self.estimate['memory_mb']:.0f} MB.")
+
+        if max_memory_mb is not None and self.estimate["memory_mb"] > max_memory_mb:
+            raise MemoryError(f"The network needs about {self.estimate['memory_mb']:.0f} MB, more than {max_memory_mb} MB: "
+                              "reduce the training set or use a sparse connectivity.")
+
+        # Store the profiler, see section()
+        self.profiler = profiler
+        
+        # Configure the kernel
+        self.kernel = dict(kernel or {})
+        self.configure_kernel(self.kernel)
         
         # Declare params of static synapses
         W_IN_CX  = -4
@@ -39,22 +137,40 @@ class Network:
         ALPHA_SYM = 1.0                           # Alpha of the symmetric STDP synapse
         
         # Declate set of cx neurons
-        self.SET_CX_NEURON = 20                 # Groups of 20 neurons for each image in the training set.
+        self.SET_CX_NEURON = CX_GROUP_SIZE      # Groups of 20 neurons for each image in the training set.
         
         # Store number of training images
         self.n_train_images = n_train_images
         
         # Declare number of populations
-        self.IN_N = 200
-        self.TC_N = 324                                     # The number of thalamic neurons is the same as the dimension of the feature vector produced by the pre-processing of visual input
-        self.RE_N = 200
+        self.IN_N = POPULATION_SIZES["in"]
+        self.TC_N = POPULATION_SIZES["tc"]                  # The number of thalamic neurons is the same as the dimension of the feature vector produced by the pre-processing of visual input
+        self.RE_N = POPULATION_SIZES["re"]
         self.cx_n = self.SET_CX_NEURON * n_train_images     # Groups of 20 neurons for each image in the training set. In a first set of runs, the training set was composed of 9 images.
         
         # Declare Poisson generator signals
         self.contextual_list = [0] * n_train_images
         self.sleep_osc = None
+        self.generators = []                                # Windowed generators of this network, see reset()
+        
+        # Parameters' regime, 'awake' or 'sleep', see set_sleep_params() and set_awake_params()
+        self.regime = 'awake'
+        
+        # Report of the last sleep, see sleep_until_converged()
+        self.sleep_report = None
+        
+        # Simulation time of the checkpoint the network was restored from, see load_checkpoint()
+        self.checkpoint_time = 0.0
+        
+        # Declare weight snapshots, see take_snapshot()
+        self.snapshots = {}
+        
+        # Declare stored states, see store_state() and reset()
+        self.store_states = store_states
+        self.states = {}
         
         # Declare devices
+        self.recording = {}
         self.mult_cx = None
         self.mult_in = None 
         self.mult_tc = None 
@@ -71,23 +187,35 @@ class Network:
         nest.SetDefaults('aeif_cond_alpha', neuron_params)
 
         # Creating populations
-        self.cx_pop = nest.Create('aeif_cond_alpha', self.cx_n)
-        self.in_pop = nest.Create('aeif_cond_alpha', self.IN_N)
-        self.tc_pop = nest.Create('aeif_cond_alpha', self.TC_N)
-        self.re_pop = nest.Create('aeif_cond_alpha', self.RE_N)
+        with self.section('create_populations'):
+            self.cx_pop = nest.Create('aeif_cond_alpha', self.cx_n)
+            self.in_pop = nest.Create('aeif_cond_alpha', self.IN_N)
+            self.tc_pop = nest.Create('aeif_cond_alpha', self.TC_N)
+            self.re_pop = nest.Create('aeif_cond_alpha', self.RE_N)
         
         # Connect populations with static synapses
-        nest.Connect(self.in_pop, self.cx_pop, syn_spec={"weight": W_IN_CX}) # inhibitory interneurons -> pyramidal neurons
-        nest.Connect(self.cx_pop, self.in_pop, syn_spec={"weight": W_CX_IN}) # pyramidal neurons -> inhibitory interneurons
-        nest.Connect(self.tc_pop, self.re_pop, syn_spec={"weight": W_TC_RE}) # thalamic relay -> reticular neurons
-        nest.Connect(self.re_pop, self.tc_pop, syn_spec={"weight": W_RE_TC}) # reticular neurons -> thalamic relay
-        nest.Connect(self.in_pop, self.in_pop, syn_spec={"weight": W_IN_IN}) # inhibitory interneurons -> inhibitory interneuros
-        nest.Connect(self.re_pop, self.re_pop, syn_spec={"weight": W_RE_RE}) # reticular neurons -> reticular neurons
+        with self.section('connect_static'):
+            nest.Connect(self.in_pop, self.cx_pop, syn_spec={"weight": W_IN_CX}) # inhibitory interneurons -> pyramidal neurons
+            nest.Connect(self.cx_pop, self.in_pop, syn_spec={"weight": W_CX_IN}) # pyramidal neurons -> inhibitory interneurons
+            nest.Connect(self.tc_pop, self.re_pop, syn_spec={"weight": W_TC_RE}) # thalamic relay -> reticular neurons
+            nest.Connect(self.re_pop, self.tc_pop, syn_spec={"weight": W_RE_TC}) # reticular neurons -> thalamic relay
+            nest.Connect(self.in_pop, self.in_pop, syn_spec={"weight": W_IN_IN}) # inhibitory interneurons -> inhibitory interneuros
+            nest.Connect(self.re_pop, self.re_pop, syn_spec={"weight": W_RE_RE}) # reticular neurons -> reticular neurons
         
         # Create weight recorders for the STDP synapses
-        wr_cxcx = nest.Create("weight_recorder")      
-        wr_cxtc = nest.Create("weight_recorder")   
-        wr_tccx = nest.Create("weight_recorder")
+        self.weight_tracking = weight_tracking
+        self.weight_recorders = {}
+        self.weight_trace = []
+        
+        if weight_tracking != 'summary':
+            for projection, (pre_name, post_name, _) in PLASTIC_PROJECTIONS.items():
+                self.weight_recorders[projection] = nest.Create("weight_recorder")
+                
+                # Only record the synapses between a few neurons of each population
+                if weight_tracking == 'sampled':
+                    self.weight_recorders[projection].set(
+                        senders=self.sample_neurons(getattr(self, f"{pre_name}_pop"), tracked_neurons),
+                        targets=self.sample_neurons(getattr(self, f"{post_name}_pop"), tracked_neurons))
         
         # Params for STDP synapses
         #self.syn_dict_cxcx = {"synapse_model": "stdp_synapse", 
@@ -97,9 +225,8 @@ class Network:
                             #"weight_recorder": wr_cxcx}
         
         self.syn_dict_cxcx = {"alpha": ALPHA_SYM,
-                            "weight": W_INIT,                              
-                            "Wmax": W_MAX_CXCX,
-                            "weight_recorder": wr_cxcx}
+                            "weight": W_INIT,
+                            "Wmax": W_MAX_CXCX}
 
         """self.syn_dict_cxtc = {"synapse_model": "stdp_synapse", 
                             "alpha": ALPHA_SYM,
@@ -109,8 +236,7 @@ class Network:
         
         self.syn_dict_cxtc = {"alpha": ALPHA_SYM,
                             "weight": W_INIT,
-                            "Wmax": W_MAX_CXTC,
-                            "weight_recorder": wr_cxtc}
+                            "Wmax": W_MAX_CXTC}
 
         """self.syn_dict_tccx = {"synapse_model": "stdp_synapse", 
                             "alpha": ALPHA_SYM,
@@ -120,23 +246,89 @@ class Network:
         
         self.syn_dict_tccx = {"alpha": ALPHA_SYM,
                             "weight": W_INIT,
-                            "Wmax": W_MAX_TCCX,
-                            "weight_recorder": wr_tccx}
+                            "Wmax": W_MAX_TCCX}
+        
+        for projection, weight_recorder in self.weight_recorders.items():
+            getattr(self, f"syn_dict_{projection}")["weight_recorder"] = weight_recorder
+        
+        # Rescale the weights of the sparse projections to keep the input drive comparable
+        self.weight_scales = {}
+        for projection, (pre_name, _, _) in PLASTIC_PROJECTIONS.items():
+            n_pre = len(getattr(self, f"{pre_name}_pop"))
+            scale = n_pre / expected_indegree(self.connectivity[projection], n_pre)
+            syn_dict = getattr(self, f"syn_dict_{projection}")
+            syn_dict["weight"] *= scale
+            syn_dict["Wmax"] *= scale
+            self.weight_scales[projection] = scale
         
         # Copy STDP model
-        nest.CopyModel("stdp_synapse", "stdp_synapse_cxcx", self.syn_dict_cxcx)
-        nest.CopyModel("stdp_synapse", "stdp_synapse_cxtc", self.syn_dict_cxtc) 
-        nest.CopyModel("stdp_synapse", "stdp_synapse_tccx", self.syn_dict_tccx) 
+        with self.section('copy_models'):
+            for projection, (_, _, synapse_model) in PLASTIC_PROJECTIONS.items():
+                syn_dict = getattr(self, f"syn_dict_{projection}")
+                
+                # Another network of the kernel (e.g. a replica, see Replicas) may have copied the model already
+                if synapse_model in nest.synapse_models:
+                    nest.SetDefaults(synapse_model, syn_dict)
+                else:
+                    nest.CopyModel("stdp_synapse", synapse_model, syn_dict)
 
         # Connect populations
         #nest.Connect(self.cx_pop, self.cx_pop, syn_spec=self.syn_dict_cxcx)         # Cx -> Cx
         #nest.Connect(self.cx_pop, self.tc_pop, syn_spec=self.syn_dict_cxtc)         # Cx -> Tc
         #nest.Connect(self.tc_pop, self.cx_pop, syn_spec=self.syn_dict_tccx)         # TC -> Cx
         
-        nest.Connect(self.cx_pop, self.cx_pop, syn_spec="stdp_synapse_cxcx")         # Cx -> Cx
-        nest.Connect(self.cx_pop, self.tc_pop, syn_spec="stdp_synapse_cxtc")         # Cx -> Tc
-        nest.Connect(self.tc_pop, self.cx_pop, syn_spec="stdp_synapse_tccx")         # TC -> Cx        
+        with self.section('connect_plastic'):
+            for projection, (pre_name, post_name, synapse_model) in PLASTIC_PROJECTIONS.items():
+                pre_pop = getattr(self, f"{pre_name}_pop")
+                post_pop = getattr(self, f"{post_name}_pop")
+                
+                if connections and projection in connections:
+                    # Rebuild the given connections
+                    sources, targets = connections[projection]
+                    nest.Connect(np.asarray(pre_pop.tolist())[sources], np.asarray(post_pop.tolist())[targets], 
+                                 conn_spec="one_to_one", syn_spec={"synapse_model": synapse_model})
+                else:
+                    nest.Connect(pre_pop, post_pop, conn_spec=self.connectivity[projection], syn_spec=synapse_model)
+        
+        # Remember the initial state, see reset()
+        if store_states:
+            self.store_state('initial')
     
+    def section(self, name, **info):
+        """
+        Profiled section of code (see Profiler.section), or a no-op context without profiler.
+        
+        :param name: Name of the section.
+        :type: str
+        """
+        if self.profiler is None:
+            return nullcontext()
+        
+        return self.profiler.section(name, **info)
+    
+    def configure_kernel(self, kernel):
+        """
+        Apply a kernel configuration (threads, seed, resolution, virtual_processes, see KERNEL_OPTIONS).
+        
+        :param kernel: Kernel configuration.
+        :type: dict
+        """
+        unknown = set(kernel) - set(KERNEL_OPTIONS)
+        assert not unknown, f"Unknown kernel options: {sorted(unknown)}."
+        
+        if not kernel:
+            return
+        
+        assert nest.network_size == 0, "The kernel must be configured before creating nodes: call nest.ResetKernel() first."
+        
+        # The number of virtual processes and of threads are exclusive in NEST
+        status = {KERNEL_OPTIONS[key]: value for key, value in kernel.items() if value is not None}
+        if 'total_num_virtual_procs' in status:
+            status.pop('local_num_threads', None)
+        
+        nest.SetKernelStatus(status)
+    
+    @profiled
     def create_context_signal(self, time_id): 
         """
         Create the contextual signal using Poissan generator.
@@ -160,17 +352,18 @@ class Network:
         time_stop = time_start + SIGN_DUR -  3.0        # Set time stop of Poisson generator
         
         # Generate contextual signal
-        context_sign = nest.Create("poisson_generator")
+        context_sign = self._create_generator("poisson_generator")
         
         # Set frequencies
         context_sign.set(rate=CONTEXT_RATE, start=time_start, stop=time_stop)
         
         # Display result
-        print("Contextual signal successfully created.")
+        logger.info("Contextual signal successfully created.")
                 
         #  Return Pooisson generator
         return context_sign
     
+    @profiled
     def create_context_list(self): 
         """
         Create a contextual signal list using Poissan generator.
@@ -202,7 +395,7 @@ class Network:
             self.contextual_list[n_train] = context_sign
         
         # Display result
-        print("Contextual signal list successfully created and connected.")
+        logger.info("Contextual signal list successfully created and connected.")
             
     def switch_input_on(self, list_index, signal_type):
         # Declare variables
@@ -220,6 +413,92 @@ class Network:
             context_sign = self.contextual_list[list_index]
             nest.SetStatus(context_sign, {'rate': OFF_RATE})
     
+    @profiled
+    def add_groups(self, n_images):
+        """
+        Incremental growth: append n_images new groups of 20 cx neurons, with their contextual signals, to learn new 
+        images without rebuilding the cortex. Only the new rows and columns of the plastic projections are connected 
+        (new cx -> cx, cx -> new cx, new cx -> tc and tc -> new cx), so the learned weights stay untouched and the cost is 
+        proportional to the added part.
+        
+        The new neurons take the b of the cx population, the new in -> cx synapses the current in -> cx weight and the new 
+        plastic synapses the current alpha and learning rate of their projection, so the network can grow in the awake 
+        or in the sleep regime and with frozen plasticity. The new plastic synapses get the initial weight and Wmax of 
+        __init__, scaled by n_pre / expected in-degree for the grown cx population; the weights of the existing synapses 
+        are left untouched. With a fixed_indegree rule, the new neurons get their in-degree from the whole cx population 
+        and the existing neurons keep theirs. The new node ids are not contiguous with the old ones: see 
+        analysis.node_indices. The states stored for reset() describe the smaller network, 
+        so they are dropped.
+        
+        :param n_images: Number of new training images (groups of 20 neurons).
+        :type: int
+
+        Returns:
+            NodeCollection: the new cx neurons.
+        """
+        assert isinstance(n_images, int) and n_images > 0, "Type an int value higher than 0."
+        
+        # Declare variables
+        W_CX_IN = 60
+        INIT_RATE = 0.0                             # Hz
+        WEIGHT_SIGN_CX = 15                         # Weight of connection between contextual signal and cx population
+        old_cx = self.cx_pop
+        b = old_cx[0].get('b')
+        w_in_cx = np.atleast_1d(nest.GetConnections(self.in_pop, old_cx[0], synapse_model='static_synapse').get('weight'))[0]
+        
+        # Create the new neurons
+        with self.section('grow_populations', n_images=n_images):
+            new_cx = nest.Create('aeif_cond_alpha', self.SET_CX_NEURON * n_images, params={"b": b})
+            self.cx_pop = old_cx + new_cx
+            self.n_train_images += n_images
+            self.cx_n = len(self.cx_pop)
+            self.estimate = estimate_network(self.n_train_images, self.connectivity)
+        
+        # Static synapses of the new neurons
+        with self.section('grow_static'):
+            nest.Connect(self.in_pop, new_cx, syn_spec={"weight": w_in_cx})
+            nest.Connect(new_cx, self.in_pop, syn_spec={"weight": W_CX_IN})
+        
+        # New rows and columns of the plastic projections
+        with self.section('grow_plastic'):
+            for projection, (pre_name, post_name, synapse_model) in PLASTIC_PROJECTIONS.items():
+                conn_spec = self.connectivity[projection]
+                pre_pop = getattr(self, f"{pre_name}_pop")
+                post_pop = getattr(self, f"{post_name}_pop")
+                syn_spec = self._growth_syn_spec(projection, old_cx)
+                
+                # New targets, from all the sources
+                if post_name == 'cx':
+                    nest.Connect(pre_pop, new_cx, conn_spec=conn_spec, syn_spec=syn_spec)
+                
+                # New sources, to the old targets (their in-degree is fixed with fixed_indegree)
+                if pre_name == 'cx' and conn_spec["rule"] != 'fixed_indegree':
+                    old_targets = old_cx if post_name == 'cx' else post_pop
+                    nest.Connect(new_cx, old_targets, conn_spec=conn_spec, syn_spec=syn_spec)
+        
+        # Contextual signals of the new groups, switched off (see switch_input_on)
+        for group in range(n_images):
+            context_sign = nest.Create("poisson_generator", params={"rate": INIT_RATE})
+            nest.Connect(context_sign, new_cx[group * self.SET_CX_NEURON:(group + 1) * self.SET_CX_NEURON], 
+                         syn_spec={"weight": WEIGHT_SIGN_CX})
+            self.contextual_list.append(context_sign)
+        
+        # Record the new neurons with the cx devices recording the whole population
+        config = self.recording.get('cx')
+        if config and config["neurons"] is None:
+            if config["voltage"]:
+                nest.Connect(self.mult_cx, new_cx)
+            if config["spikes"]:
+                nest.Connect(new_cx, self.spikes_cx)
+        
+        self.states = {}
+        
+        # Display result
+        logger.info(f"{n_images} groups added: the cx population has {self.cx_n} neurons.")
+        
+        return new_cx
+
+    @profiled
     def create_inhib_signal(self, time_id): 
         """
         Create the inhibitory signal using Poissan generator.
@@ -243,17 +522,35 @@ class Network:
         time_stop = time_start + SIGN_DUR - 1.0           # Set time stop of Poisson generator
         
         # Generate inhibitory signal
-        inhib_sign = nest.Create("poisson_generator")
+        inhib_sign = self._create_generator("poisson_generator")
         
         # Set frequencies
         inhib_sign.set(rate=INHIB_RATE, start=time_start, stop=time_stop)
         
         # Display result
-        print("Inhibitory signal successfully created.")
+        logger.info("Inhibitory signal successfully created.")
                 
         #  Return Pooisson generator
         return inhib_sign
 
+    def train_signal_times(self, time_id):
+        """
+        Start and stop times of the training signal of the time_id-th presentation.
+        
+        :param time_id: it defines the start time of the Poisson signal (see create_train_signal).
+        :type: int or np.ndarray
+
+        Returns:
+            Tuple: start and stop times in ms.
+        """
+        # Declare variables
+        SIGN_DUR = 650                                  # Duration of training signal in ms
+        time_start = time_id * SIGN_DUR * 1.34 + 1.0         # Set time start of Poisson generator
+        time_stop = time_start + SIGN_DUR - 1.0           # Set time stop of Poisson generator
+        
+        return time_start, time_stop
+
+    @profiled
     def create_train_signal(self, time_id): 
         """
         Create the training signal using Poissan generator.
@@ -272,22 +569,21 @@ class Network:
         
         # Declare variables
         TRAIN_RATE = 30000.0                              # Hz
-        SIGN_DUR = 650                                  # Duration of training signal in ms
-        time_start = time_id * SIGN_DUR * 1.34 + 1.0         # Set time start of Poisson generator
-        time_stop = time_start + SIGN_DUR - 1.0           # Set time stop of Poisson generator
+        time_start, time_stop = self.train_signal_times(time_id)   # Set time start and stop of Poisson generator
         
         # Generate training signal
-        train_sign = nest.Create("poisson_generator")
+        train_sign = self._create_generator("poisson_generator")
         
         # Set frequencies
         train_sign.set(rate=TRAIN_RATE, start=time_start, stop=time_stop)
         
         # Display result
-        print("Training signal successfully created.")
+        logger.info("Training signal successfully created.")
                 
         #  Return Pooisson generator
         return train_sign
     
+    @profiled
     def input_context_signal(self, neuron_group):
         """
         Every time a new training image is presented to the network through the thalamic pathway, the facilitation signal 
@@ -319,12 +615,13 @@ class Network:
         context_sign = self.create_context_signal(neuron_group)
         
         # Connect them to the neurons
-        print("Connecting input to the cx population...")
+        logger.info("Connecting input to the cx population...")
         nest.Connect(context_sign, self.cx_pop[start_slice:end_slice], syn_spec={"weight": WEIGHT_SIGN_CX})
         
         # Display connection
-        print("... contextual signal successfully connected to the cx population.")
+        logger.info("... contextual signal successfully connected to the cx population.")
     
+    @profiled
     def input_inhib_signal(self, time_id):
         """
         A 10 kHz Poisson spike train is provided to inhibitory neurons to prevent already trained neurons to respond 
@@ -344,12 +641,13 @@ class Network:
         inhib_sign = self.create_inhib_signal(time_id)    
         
         # Connect them to the neurons
-        print("Connecting input to the in population...")
+        logger.info("Connecting input to the in population...")
         nest.Connect(inhib_sign, self.in_pop, syn_spec={"weight": WEIGHT_INH_IN})   
         
         # Display connection
-        print("... inhibitory signal successfully connected to the in population.")     
+        logger.info("... inhibitory signal successfully connected to the in population.")     
 
+    @profiled
     def input_train_signal(self, time_id, feature_vector):
         """
         During the retrieval phase only the 30 kHz input to thalamic cell is provided, while the contextual signal is off.
@@ -369,15 +667,62 @@ class Network:
         # Generate training signal
         train_sign = self.create_train_signal(time_start)
 
-        # Connect training signal to neurons based on the feature vector
-        print("Connecting input to the tc population...")
-        for i, apply_input in enumerate(feature_vector):
-            if apply_input:
-                nest.Connect(train_sign, self.tc_pop[i], syn_spec={"weight": WEIGHT_TRAIN_TC})
+        # Connect training signal to the active neurons of the feature vector in a single call (none for an all-zero vector)
+        logger.info("Connecting input to the tc population...")
+        active_indices = np.flatnonzero(np.asarray(feature_vector))
+        if len(active_indices):
+            nest.Connect(train_sign, self.tc_pop[active_indices.tolist()], syn_spec={"weight": WEIGHT_TRAIN_TC})
         
         # Display connection
-        print("... training signal successfully connected to the tc population.")   
+        logger.info("... training signal successfully connected to the tc population.")   
+
+    @profiled
+    def input_train_signals(self, time_ids, feature_vectors):
+        """
+        Batch version of input_train_signal: one training signal per image, all created with one nest.Create and wired to 
+        their active tc neurons with one nest.Connect.
+        
+        :param time_ids: Presentation slot of each image (see create_train_signal).
+        :type: list
+        
+        :param feature_vectors: Binary feature vectors of the images, with shape (len(time_ids), 324). Bit-packed vectors 
+                                can be expanded with MNIST.unpack_features.
+        :type: np.ndarray
+
+        Returns:
+            NodeCollection: the Poisson generators, in the order of time_ids.
+        """
+        # Variables
+        TRAIN_RATE = 30000.0                                        # Hz
+        WEIGHT_TRAIN_TC = 8                                         # Weight of Poisson to tc population
+        time_ids = np.asarray(time_ids)
+        feature_vectors = np.asarray(feature_vectors)
+        
+        assert feature_vectors.shape == (len(time_ids), self.TC_N), f"Type one feature vector of length {self.TC_N} per time_id."
+        assert np.all(time_ids >= 0), f"Type values higher than 0."
+        
+        # Generate training signals
+        time_start, time_stop = self.train_signal_times(time_ids.astype(float))
+        train_signs = self._create_generator("poisson_generator", len(time_ids), 
+                                               params={"rate": TRAIN_RATE, "start": time_start.tolist(), "stop": time_stop.tolist()})
+        
+        # Pair every generator with the active neurons of its feature vector
+        images, active_indices = np.nonzero(feature_vectors)
+        sources = np.asarray(train_signs.tolist())[images]
+        targets = np.asarray(self.tc_pop.tolist())[active_indices]
         
+        # Connect all of them at once
+        logger.info("Connecting input to the tc population...")
+        if len(sources):
+            nest.Connect(sources, targets, conn_spec="one_to_one", 
+                         syn_spec={"weight": np.full(len(sources), WEIGHT_TRAIN_TC, dtype=float)})
+        
+        # Display connection
+        logger.info(f"... {len(time_ids)} training signals successfully connected to the tc population.")   
+        
+        return train_signs
+        
+    @profiled
     def input_sleep(self):
         """
         After the training stage, the sleep-like thalamo-cortical spontaneous slow oscillations activity is induced for 
@@ -390,20 +735,125 @@ class Network:
         # Variables
         OSC_RATE = 700.0                                    # Hz
         SLEEP_DUR = 600000.0                                # Sleep duration in ms
-        NEW_WEIGHT_IN_CX = -0.5                             # Weight of the synapse between in -> cx population
-        ALPHA_ASSYM = 3.0                                   # Alpha for the assymetric STDP plasticity stage
         start_time = 18000                                  # Set start time
         stop_time = start_time + SLEEP_DUR                  # Set stop time
-        b = 60                                              # SFA parameter
         
         # # Create sleep oscillation
-        print("Generating sleep oscillations...")
-        self.sleep_osc = nest.Create("poisson_generator")
+        logger.info("Generating sleep oscillations...")
+        self.sleep_osc = self._create_generator("poisson_generator")
         
         # Set frequencies
         self.sleep_osc.set(rate=OSC_RATE, start=start_time, stop=stop_time)
-        print("...done.")
+        logger.info("...done.")
                
+        # Switch the network to the slow oscillating regime
+        self.set_sleep_params()
+        
+        # Switch off the devices that do not record during sleep
+        self.gate_recorders('sleep', time=start_time)
+        
+        # Connect sleep oscillation to the neurons
+        logger.info("Connecting input to the cortex populations...")
+        nest.Connect(self.sleep_osc, self.cx_pop)
+        
+        # Display connection
+        logger.info("... sleep oscillation signal successfully inputed to the cx and in populations (i.e., whole cortex).")      
+
+    @profiled
+    def store_state(self, label):
+        """
+        Store the current state of the network under a label, to restore it with reset(). With store_states=True (see 
+        Network), the 'initial' state is stored at the network creation and the 'trained' state after every training 
+        phase of run_schedule().
+        
+        The state holds the parameters' regime, the neuron state and parameters (V_m, w, conductances, b), the weight, 
+        alpha and learning rate of all the plastic synapses and the in -> cx weights, i.e. everything changed by 
+        training, sleep (input_sleep, set_sleep_params) and freeze_plasticity().
+        
+        :param label: Name of the state, e.g. 'initial', 'trained' or 'post-sleep'.
+        :type: str
+        """
+        # Declare variables
+        state = {"neurons": {}, "connections": {}, "regime": self.regime}
+        
+        # Neuron state and parameters
+        for name in ('cx', 'in', 'tc', 're'):
+            status = getattr(self, f"{name}_pop").get(list(CHECKPOINT_STATE + CHECKPOINT_PARAMS))
+            state["neurons"][name] = {key: np.asarray(values, dtype=float) for key, values in status.items()}
+        
+        # Synapses, kept with their SynapseCollection so that reset() sets them back in the same order
+        for connection_name, pre_name, post_name, synapse_model, keys in self._checkpoint_connections():
+            keys = RESET_PLASTIC if keys == CHECKPOINT_PLASTIC else keys
+            connections, values = self._connection_state(getattr(self, f"{pre_name}_pop"), getattr(self, f"{post_name}_pop"), synapse_model, keys)
+            state["connections"][connection_name] = (connections, {key: values[key] for key in keys})
+        
+        self.states[label] = state
+    
+    @profiled
+    def reset(self, label='initial', clear_recordings=True):
+        """
+        Fast trial reset: bring the network back to a state stored with store_state(), without rebuilding it. Neuron 
+        state and parameters and synapse properties are set in bulk, the signals created by this network are switched 
+        off (the contextual list by its rate, the other generators by their window), so that a new Schedule can be run 
+        on the same connectivity (e.g. another seed or stimulus order). Generators of other networks of the kernel (e.g. 
+        replicas) are left untouched.
+        
+        NEST cannot set the kernel time back, so the simulation continues from the current time. The spike history of 
+        the neurons (postsynaptic STDP traces) is not restored: it decays within a few tens of ms.
+        
+        :param label: State to restore: 'initial' (default), 'trained' or any label given to store_state().
+        :type: str
+        
+        :param clear_recordings: Also delete the events of the recorders in memory. Defaults to True.
+        :type: bool
+        """
+        assert label in self.states, f"Type one of {list(self.states)}, or store the state first (see store_state)."
+        
+        # Declare variables
+        OFF_RATE = 0.0                                      # Hz
+        state = self.states[label]
+        now = nest.biological_time
+        
+        # Neuron state and parameters
+        for name, values in state["neurons"].items():
+            getattr(self, f"{name}_pop").set({key: array.tolist() for key, array in values.items()})
+        
+        # Synapses
+        for connections, values in state["connections"].values():
+            connections.set({key: array.tolist() for key, array in values.items()})
+        
+        # Regime of the restored parameters, see save_checkpoint()
+        self.regime = state["regime"]
+        
+        # Switch the signals of this network off from now on
+        for context_sign in self.contextual_list:
+            if context_sign:
+                context_sign.set(rate=OFF_RATE)
+        for generator in self.generators:
+            generator.set(start=now, stop=now)
+        
+        # Clear the recorded events
+        if clear_recordings:
+            for name, config in self.recording.items():
+                if config["record_to"] != 'memory':
+                    continue
+                for device in (getattr(self, f"mult_{name}"), getattr(self, f"spikes_{name}")):
+                    device.set(n_events=0)
+        
+        # Display result
+        logger.info(f"Network reset to the {label} state.")
+
+    @profiled
+    def set_sleep_params(self):
+        """
+        Parameters' change of the sleep stage (see input_sleep): b=60 in the cx population, in -> cx weights set to -0.5
+        and asymmetric STDP (alpha=3.0) in the recurrent cx connectivity.
+        """
+        # Variables
+        NEW_WEIGHT_IN_CX = -0.5                             # Weight of the synapse between in -> cx population
+        ALPHA_ASSYM = 3.0                                   # Alpha for the assymetric STDP plasticity stage
+        b = 60                                              # SFA parameter
+        
         # Set the SFA parameters
         sfa_params = {"b": b}
 
@@ -413,77 +863,836 @@ class Network:
         # Change connection weight W_in_cx to -0.5 and alpha to 3.0
         # Get Connections
         syn_in_cx = nest.GetConnections(self.in_pop, self.cx_pop, synapse_model='static_synapse')
-        syn_cx_cx = nest.GetConnections(self.cx_pop, self.cx_pop, synapse_model='stdp_synapse')
+        syn_cx_cx = nest.GetConnections(self.cx_pop, self.cx_pop, synapse_model='stdp_synapse_cxcx')
 
         # Apply the new parameters to the synapse
         syn_in_cx.set({"weight": NEW_WEIGHT_IN_CX})
         syn_cx_cx.set({"alpha": ALPHA_ASSYM})
         
-        # Connect sleep oscillation to the neurons
-        print("Connecting input to the cortex populations...")
-        nest.Connect(self.sleep_osc, self.cx_pop)
+        self.regime = 'sleep'
+
+    @profiled
+    def set_awake_params(self):
+        """
+        Undo set_sleep_params: b=0.01 in the cx population, in -> cx weights back to -4 and symmetric STDP (alpha=1.0) 
+        in the recurrent cx connectivity, as set in the network creation.
+        """
+        # Variables
+        W_IN_CX = -4                                        # Weight of the synapse between in -> cx population
+        ALPHA_SYM = 1.0                                     # Alpha of the symmetric STDP synapse
+        b = 0.01                                            # SFA parameter
         
-        # Display connection
-        print("... sleep oscillation signal successfully inputed to the cx and in populations (i.e., whole cortex).")      
+        # Apply the awake parameters to the population and synapses
+        nest.SetStatus(self.cx_pop, {"b": b})
+        nest.GetConnections(self.in_pop, self.cx_pop, synapse_model='static_synapse').set({"weight": W_IN_CX})
+        nest.GetConnections(self.cx_pop, self.cx_pop, synapse_model='stdp_synapse_cxcx').set({"alpha": ALPHA_SYM})
+        
+        self.regime = 'awake'
+
+    @profiled
+    def freeze_plasticity(self):
+        """
+        Freeze the weights of the three plastic projections (STDP learning rate lambda set to 0), e.g. to evaluate a 
+        trained network without modifying it.
+        """
+        for pre_name, post_name, synapse_model in PLASTIC_PROJECTIONS.values():
+            connections = nest.GetConnections(getattr(self, f"{pre_name}_pop"), getattr(self, f"{post_name}_pop"), synapse_model=synapse_model)
+            connections.set({"lambda": 0.0})
+
+    @profiled
+    def compile_schedule(self, schedule):
+        """
+        Compile a Schedule into a fixed set of rate-modulated generators (inhomogeneous_poisson_generator):
+        
+        - one per tc neuron, carrying the 30 kHz training signal of every presentation where the neuron is active;
+        - one per group of 20 cx neurons, carrying the 2 kHz contextual signal of its training presentations;
+        - one for the 10 kHz inhibitory signal to the in population and one for the 700 Hz sleep noise to the cortex.
+        
+        The number of nodes does not grow with the number of presented images. The schedule starts at the current 
+        simulation time.
+        
+        :param schedule: Protocol to compile.
+        :type: Schedule
+
+        Returns:
+            Dict: the generators by signal ('train', 'context', 'inhib', 'sleep'); signals never used are not created.
+        """
+        # Declare variables
+        TRAIN_RATE = 30000.0                                # Hz
+        CONTEXT_RATE = 2000.0                               # Hz
+        INHIB_RATE = 10000.0                                # Hz
+        OSC_RATE = 700.0                                    # Hz
+        WEIGHT_TRAIN_TC = 8                                 # Weight of Poisson to tc population
+        WEIGHT_SIGN_CX = 15                                 # Weight of connection between contextual signal and cx population
+        WEIGHT_INH_IN = 5                                   # Weight of inhibitory signal to in population
+        resolution = nest.resolution
+        t0 = nest.biological_time
+        generators = {}
+
+        def rate_params(traces):
+            # Shift the traces to the current time, on the simulation grid
+            return [{"rate_times": (np.round((t0 + times) / resolution) * resolution).tolist(), 
+                     "rate_values": values.tolist()} for times, values in traces]
+
+        # Training signal: one generator per tc neuron
+        if schedule.presentations:
+            generators['train'] = self._create_generator("inhomogeneous_poisson_generator", self.TC_N)
+            nest.SetStatus(generators['train'], rate_params(schedule.tc_traces(self.TC_N, TRAIN_RATE)))
+            nest.Connect(generators['train'], self.tc_pop, conn_spec="one_to_one", syn_spec={"weight": WEIGHT_TRAIN_TC})
+        
+        # Contextual signal: one generator per group of cx neurons
+        n_groups = self.cx_n // self.SET_CX_NEURON
+        if any(p["group"] is not None for p in schedule.presentations):
+            generators['context'] = self._create_generator("inhomogeneous_poisson_generator", n_groups)
+            nest.SetStatus(generators['context'], rate_params(schedule.context_traces(n_groups, CONTEXT_RATE)))
+            sources = np.repeat(generators['context'].tolist(), self.SET_CX_NEURON)
+            nest.Connect(sources, np.asarray(self.cx_pop.tolist()), conn_spec="one_to_one", 
+                         syn_spec={"weight": np.full(self.cx_n, WEIGHT_SIGN_CX, dtype=float)})
+        
+        # Inhibitory signal
+        if any(p["inhibit"] for p in schedule.presentations):
+            generators['inhib'] = self._create_generator("inhomogeneous_poisson_generator")
+            nest.SetStatus(generators['inhib'], rate_params([schedule.inhib_trace(INHIB_RATE)]))
+            nest.Connect(generators['inhib'], self.in_pop, syn_spec={"weight": WEIGHT_INH_IN})
+        
+        # Sleep oscillation
+        if schedule.sleeps:
+            generators['sleep'] = self._create_generator("inhomogeneous_poisson_generator")
+            nest.SetStatus(generators['sleep'], rate_params([schedule.sleep_trace(OSC_RATE)]))
+            nest.Connect(generators['sleep'], self.cx_pop)
+        
+        # Display result
+        logger.info(f"Schedule successfully compiled into {sum(len(g) for g in generators.values())} generators.")
+        
+        return generators
+
+    @profiled
+    def run_schedule(self, schedule):
+        """
+        Compile a Schedule and simulate it, with one nest.Simulate call per block of consecutive presentations of the 
+        same phase. The sleep parameters (see set_sleep_params) are applied when a sleep phase starts, and the awake ones 
+        (see set_awake_params) when a training or retrieval phase follows a sleep phase. Phase-gated recorders (see 
+        connect_all_devices) are switched on and off at every change of phase.
+        
+        :param schedule: Protocol to run.
+        :type: Schedule
+
+        Returns:
+            Dict: the generators created by compile_schedule.
+        """
+        # Compile the protocol
+        generators = self.compile_schedule(schedule)
+        
+        # Simulate each phase at once
+        previous_phase = None
+        for phase, start, stop in schedule.phases:
+            if phase == 'sleep':
+                self.set_sleep_params()
+            elif previous_phase == 'sleep':
+                self.set_awake_params()
+            if phase != previous_phase:
+                self.gate_recorders(phase)
+            previous_phase = phase
+            
+            logger.info(f"Simulating {phase} phase ({stop - start} ms)...")
+            with self.section(f"simulate:{phase}", simulated_ms=stop - start):
+                nest.Simulate(stop - start)
+            
+            # Remember the post-training state, see reset()
+            if phase == 'training' and self.store_states:
+                self.store_state('trained')
+        
+        logger.info("...done.")
+        
+        return generators
    
-    def set_multimeters(self):
+    def set_multimeters(self, record_to='memory'):
         """
         Create multimeters to all populations.
         
+        :param record_to: Recording backend, 'memory' or 'ascii'. With 'ascii' the events are streamed during the 
+                          simulation to files labelled mult_<population> in nest.data_path (see read_recording).
+        :type: str
+        
         :return: four multimeters respectively to the cx, in, tc, and re populations.
         """
         # cx population
         self.mult_cx = nest.Create("multimeter")
-        self.mult_cx.set(record_from=["V_m"])
+        self.mult_cx.set(record_from=["V_m"], record_to=record_to, label="mult_cx")
 
         # in
         self.mult_in = nest.Create("multimeter")
-        self.mult_in.set(record_from=["V_m"])
+        self.mult_in.set(record_from=["V_m"], record_to=record_to, label="mult_in")
 
         # tc
         self.mult_tc = nest.Create("multimeter")
-        self.mult_tc.set(record_from=["V_m"])
+        self.mult_tc.set(record_from=["V_m"], record_to=record_to, label="mult_tc")
 
         # re
         self.mult_re = nest.Create("multimeter")
-        self.mult_re.set(record_from=["V_m"])
+        self.mult_re.set(record_from=["V_m"], record_to=record_to, label="mult_re")
         
-    def set_spike_recorders(self):
+    def set_spike_recorders(self, record_to='memory'):
         """
         Create spike records to all populations.
         
+        :param record_to: Recording backend, 'memory' or 'ascii'. With 'ascii' the spikes are streamed during the 
+                          simulation to files labelled spikes_<population> in nest.data_path (see read_recording).
+        :type: str
+        
         :return: four spike recorders respectively to the cx, in, tc, and re populations.
         """
         # cx population
-        self.spikes_cx = nest.Create("spike_recorder")
+        self.spikes_cx = nest.Create("spike_recorder", params={"record_to": record_to, "label": "spikes_cx"})
 
         # in
-        self.spikes_in = nest.Create("spike_recorder")
+        self.spikes_in = nest.Create("spike_recorder", params={"record_to": record_to, "label": "spikes_in"})
         
         # tc
-        self.spikes_tc = nest.Create("spike_recorder")
+        self.spikes_tc = nest.Create("spike_recorder", params={"record_to": record_to, "label": "spikes_tc"})
 
         # re
-        self.spikes_re = nest.Create("spike_recorder")
+        self.spikes_re = nest.Create("spike_recorder", params={"record_to": record_to, "label": "spikes_re"})
     
-    def connect_all_devices(self):
+    @profiled
+    def connect_all_devices(self, recording=None):
         """
         Connect multimeters and spike recorders created with set_multimeters() and set_spike_recorders().
+        
+        By default every neuron of the four populations is recorded during the whole run. The recording can be limited 
+        per population to keep long runs (e.g. the 600 s sleep phase) memory-bounded, for example:
+        
+            net.connect_all_devices({"cx": {"voltage": False, "phases": ('retrieval',)},
+                                     "tc": {"neurons": 20, "interval": 10.0}})
+        
+        records only cx spikes during retrieval, and V_m and spikes of 20 tc neurons with V_m sampled every 10 ms.
+        
+        :param recording: Configuration per population ('cx', 'in', 'tc', 're'), with the keys of RECORDING_DEFAULTS.
+        :type: dict
         """
+        # Assert argument is valid
+        recording = recording or {}
+        unknown = set(recording) - {'cx', 'in', 'tc', 're'}
+        assert not unknown, f"Unknown populations: {sorted(unknown)}."
+        
+        # Merge the configuration with the defaults
+        self.recording = {}
+        for name in ('cx', 'in', 'tc', 're'):
+            config = recording.get(name, {})
+            assert not set(config) - set(RECORDING_DEFAULTS), f"Unknown recording options: {sorted(set(config) - set(RECORDING_DEFAULTS))}."
+            self.recording[name] = {**RECORDING_DEFAULTS, **config}
+        
         # Get multimeters
         self.set_multimeters()
         self.set_spike_recorders()
         
-        # Connect the multimeter to all populations
-        nest.Connect(self.mult_cx, self.cx_pop)
-        nest.Connect(self.mult_in, self.in_pop)
-        nest.Connect(self.mult_tc, self.tc_pop)
-        nest.Connect(self.mult_re, self.re_pop)
+        # Connect the multimeters and spike recorders to the recorded neurons, if any
+        for name, config in self.recording.items():
+            neurons = self.recorded_neurons(name)
+            
+            if config["voltage"]:
+                multimeter = getattr(self, f"mult_{name}")
+                multimeter.set(interval=config["interval"], record_to=config["record_to"])
+                if neurons is not None:
+                    nest.Connect(multimeter, neurons)
+            
+            if config["spikes"]:
+                spike_recorder = getattr(self, f"spikes_{name}")
+                spike_recorder.set(record_to=config["record_to"])
+                if neurons is not None:
+                    nest.Connect(neurons, spike_recorder)
+    
+    def recorded_neurons(self, name):
+        """
+        Neurons of a population recorded according to the configuration given to connect_all_devices().
+        
+        :param name: Population ('cx', 'in', 'tc' or 're').
+        :type: str
 
-        # Connect the spike_recorder to all populations
-        nest.Connect(self.cx_pop, self.spikes_cx)
-        nest.Connect(self.in_pop, self.spikes_in)
-        nest.Connect(self.tc_pop, self.spikes_tc)
-        nest.Connect(self.re_pop, self.spikes_re)
+        Returns:
+            NodeCollection: the recorded neurons, or None when no neuron is recorded (neurons=0).
+        """
+        population = getattr(self, f"{name}_pop")
+        neurons = self.recording[name]["neurons"]
+        
+        if neurons is None:
+            return population
+        
+        if isinstance(neurons, numbers.Integral):
+            assert neurons >= 0, "Type an int value higher than or equal to 0."
+            return self.sample_neurons(population, int(neurons)) if neurons > 0 else None
+        
+        return population[np.unique(neurons).tolist()]
+    
+    def sample_neurons(self, population, n):
+        """
+        Sample of n evenly spaced neurons of a population.
+        
+        :param population: Population to sample.
+        :type: NodeCollection
+        
+        :param n: Number of neurons (the whole population if larger than it).
+        :type: int
+
+        Returns:
+            NodeCollection: the sampled neurons.
+        """
+        indices = np.linspace(0, len(population) - 1, min(n, len(population))).astype(int)
+        
+        return population[np.unique(indices).tolist()]
+    
+    def gate_recorders(self, phase, time=None):
+        """
+        Switch on the devices that record in the given phase and switch off the others, from the given time on. Devices 
+        without phases (the default) are left untouched. Called by run_schedule() and input_sleep().
+        
+        :param phase: 'training', 'retrieval' or 'sleep'.
+        :type: str
+        
+        :param time: Time at which the phase starts. Defaults to the current simulation time.
+        :type: float
+        """
+        # Declare variables
+        time = nest.biological_time if time is None else time
+        
+        for name, config in self.recording.items():
+            if config["phases"] is None:
+                continue
+            
+            for device in (getattr(self, f"mult_{name}"), getattr(self, f"spikes_{name}")):
+                if phase in config["phases"]:
+                    device.set(start=time, stop=float('inf'))
+                else:
+                    device.set(stop=max(time, device.get('start')))
+
+    def read_recording(self, name, kind='spikes', chunk_size=1000000, t_start=None, t_stop=None):
+        """
+        Read the events of a recorder chunk by chunk, as compact arrays (int32 senders, float32 times and V_m).
+        
+        Recorders streaming to disk (record_to='ascii') are read from their files without loading them whole, so a 
+        600 s sleep run can be analysed in bounded memory, and already written phases can be read while the simulation 
+        goes on. Recorders in memory are returned as a single chunk.
+        
+        :param name: Population ('cx', 'in', 'tc' or 're').
+        :type: str
+        
+        :param kind: 'spikes' for the spike recorder, 'voltage' for the multimeter. Defaults to 'spikes'.
+        :type: str
+        
+        :param chunk_size: Maximum number of events per chunk. Defaults to 1e6.
+        :type: int
         
+        :param t_start: Only keep the events after t_start (ms).
+        :type: float
+        
+        :param t_stop: Only keep the events up to t_stop (ms).
+        :type: float
 
+        Returns:
+            Generator: dicts of arrays with 'senders', 'times' and, for the multimeters, 'V_m'.
+        """
+        assert kind in ('spikes', 'voltage'), "Type 'spikes' or 'voltage'."
+        
+        device = getattr(self, f"spikes_{name}" if kind == 'spikes' else f"mult_{name}")
+        
+        if device.get('record_to') == 'ascii':
+            files = device_files(device.get('label'), nest.data_path, nest.data_prefix)
+            yield from read_chunks(files, chunk_size, t_start, t_stop)
+            return
+        
+        # Recorder in memory
+        events = device.get('events')
+        times = np.asarray(events["times"], dtype=np.float32)
+        keep = np.ones(len(times), dtype=bool)
+        if t_start is not None:
+            keep &= times > t_start
+        if t_stop is not None:
+            keep &= times <= t_stop
+        
+        chunk = {"senders": np.asarray(events["senders"], dtype=np.int32)[keep], "times": times[keep]}
+        if kind == 'voltage':
+            chunk["V_m"] = np.asarray(events["V_m"], dtype=np.float32)[keep]
+        
+        yield chunk
+
+    def get_weights(self, projection):
+        """
+        Weights of a plastic projection, pulled from NEST in one call.
+        
+        :param projection: 'cxcx', 'cxtc' or 'tccx' (see PLASTIC_PROJECTIONS).
+        :type: str
+
+        Returns:
+            Dict: 'sources' and 'targets' (int32 indices within the pre and post populations), 'weights' (float32) and 
+                  'shape' (sizes of the pre and post populations).
+        """
+        assert projection in PLASTIC_PROJECTIONS, f"Type one of {list(PLASTIC_PROJECTIONS)}."
+        
+        # Declare variables
+        pre_name, post_name, synapse_model = PLASTIC_PROJECTIONS[projection]
+        pre_pop = getattr(self, f"{pre_name}_pop")
+        post_pop = getattr(self, f"{post_name}_pop")
+        
+        # Get connections
+        connections = nest.GetConnections(pre_pop, post_pop, synapse_model=synapse_model)
+        status = connections.get(['source', 'target', 'weight'])
+        
+        # A single connection gives scalars
+        return {"sources": node_indices(pre_pop, np.atleast_1d(status['source'])).astype(np.int32),
+                "targets": node_indices(post_pop, np.atleast_1d(status['target'])).astype(np.int32),
+                "weights": np.atleast_1d(np.asarray(status['weight'], dtype=np.float32)),
+                "shape": (len(pre_pop), len(post_pop))}
+    
+    @profiled
+    def take_snapshot(self, label):
+        """
+        Store the weights of the three plastic projections (cx -> cx, cx -> tc, tc -> cx) under a label, e.g. 
+        'pre-sleep' and 'post-sleep'. The index arrays are shared with the previous snapshot when the connectivity did 
+        not change, so every further snapshot only costs the weights.
+        
+        :param label: Name of the snapshot.
+        :type: str
+        """
+        # Declare variables
+        previous = list(self.snapshots.values())[-1] if self.snapshots else None
+        snapshot = {"time": nest.biological_time}
+        
+        for projection in PLASTIC_PROJECTIONS:
+            weights = self.get_weights(projection)
+            
+            # Reuse the indices of the previous snapshot if they are the same
+            if previous is not None:
+                old = previous[projection]
+                if np.array_equal(old["sources"], weights["sources"]) and np.array_equal(old["targets"], weights["targets"]):
+                    weights["sources"], weights["targets"] = old["sources"], old["targets"]
+            
+            snapshot[projection] = weights
+        
+        self.snapshots[label] = snapshot
+    
+    def weight_matrix(self, label, projection='cxcx'):
+        """
+        Dense weight matrix of a projection in a snapshot: w[i, j] is the weight from the i-th neuron of the pre 
+        population to the j-th neuron of the post population (summed over multiple connections, 0 where unconnected).
+        
+        :param label: Name of the snapshot (see take_snapshot).
+        :type: str
+        
+        :param projection: 'cxcx', 'cxtc' or 'tccx'. Defaults to 'cxcx'.
+        :type: str
+
+        Returns:
+            np.ndarray: float32 matrix with the sizes of the pre and post populations.
+        """
+        weights = self.snapshots[label][projection]
+        n_pre, n_post = weights["shape"]
+        
+        index = weights["sources"].astype(np.int64) * n_post + weights["targets"]
+        
+        return np.bincount(index, weights=weights["weights"], minlength=n_pre * n_post).reshape(n_pre, n_post).astype(np.float32)
+    
+    @profiled
+    def simulate_in_chunks(self, duration, interval, callback):
+        """
+        Simulate for duration ms in chunks of interval ms, calling callback() after every chunk. The simulation stops 
+        early if callback() returns True.
+        
+        :param duration: Total time to simulate (ms).
+        :type: float
+        
+        :param interval: Duration of a chunk (ms).
+        :type: float
+        
+        :param callback: Function without arguments called after every chunk.
+        :type: function
+
+        Returns:
+            float: the simulated time (ms).
+        """
+        # Declare variables
+        elapsed = 0.0
+        
+        while elapsed < duration:
+            step = min(interval, duration - elapsed)
+            with self.section('simulate:chunk', simulated_ms=step):
+                nest.Simulate(step)
+            elapsed += step
+            
+            if callback():
+                break
+        
+        return elapsed
+    
+    def simulate_with_snapshots(self, duration, interval, label='sleep'):
+        """
+        Simulate for duration ms, taking a weight snapshot every interval ms (e.g. every N seconds of sleep). Snapshots 
+        are labelled '<label>-<simulation time>'.
+        
+        :param duration: Total time to simulate (ms).
+        :type: float
+        
+        :param interval: Time between two snapshots (ms).
+        :type: float
+
+        Returns:
+            List: the labels of the snapshots taken.
+        """
+        # Declare variables
+        labels = []
+        
+        def snapshot():
+            labels.append(f"{label}-{nest.biological_time:g}")
+            self.take_snapshot(labels[-1])
+        
+        self.simulate_in_chunks(duration, interval, snapshot)
+        
+        return labels
+    
+    @profiled
+    def sleep_until_converged(self, max_duration=600000.0, chunk=10000.0, tolerance=1e-3, patience=2, probe=None, probe_tolerance=None):
+        """
+        Sleep-like slow oscillation phase (see input_sleep) simulated in chunks, stopping as soon as the cx -> cx weight 
+        structure has converged instead of always running the full 600 s.
+        
+        After every chunk the relative change of the cx -> cx weights, ||w - w_previous|| / ||w_previous||, is computed. 
+        The sleep stops when it stays below tolerance for patience consecutive chunks (and, with a probe, when the probe 
+        value changes by less than probe_tolerance), or when max_duration is reached. The awake parameters are restored 
+        at the end (see set_awake_params).
+        
+        :param max_duration: Maximum sleep duration (ms). Defaults to 600 s.
+        :type: float
+        
+        :param chunk: Duration of a chunk (ms). Defaults to 10 s.
+        :type: float
+        
+        :param tolerance: Threshold of the relative weight change. Defaults to 1e-3.
+        :type: float
+        
+        :param patience: Number of consecutive chunks below the threshold. Defaults to 2.
+        :type: int
+        
+        :param probe: Optional function called with the network after every chunk, returning a scalar to monitor (e.g. 
+                      the retrieval accuracy on a probe set). It runs in the awake regime (see set_awake_params), with 
+                      the plasticity frozen, the sleep oscillation muted and the recorders gated for retrieval; the 
+                      sleep is resumed afterwards, and the time simulated by the probe is not counted as sleep.
+        :type: function
+        
+        :param probe_tolerance: Threshold of the change of the probe value between chunks.
+        :type: float
+
+        Returns:
+            Dict: 'slept_ms' (sleep actually simulated), 'converged', 'times', 'weight_change' and 'probe' per chunk.
+        """
+        # Variables
+        OSC_RATE = 700.0                                    # Hz
+        start_time = nest.biological_time
+        report = {"slept_ms": 0.0, "converged": False, "times": [], "weight_change": [], "probe": []}
+        previous = {"weights": self.get_weights('cxcx')["weights"].astype(float), "probe": None, "stable": 0}
+        
+        # Create sleep oscillation, stopped at the end of the sleep (the probes may run in between)
+        self.sleep_osc = self._create_generator("poisson_generator", params={"rate": OSC_RATE, "start": start_time})
+        nest.Connect(self.sleep_osc, self.cx_pop)
+        
+        # Switch the network to the slow oscillating regime
+        self.set_sleep_params()
+        self.gate_recorders('sleep')
+        
+        def check_convergence():
+            # Relative change of the cx -> cx weights over the last chunk
+            weights = self.get_weights('cxcx')["weights"].astype(float)
+            change = np.linalg.norm(weights - previous["weights"]) / max(np.linalg.norm(previous["weights"]), 1e-12)
+            previous["weights"] = weights
+            
+            report["times"].append(nest.biological_time)
+            report["weight_change"].append(float(change))
+            
+            stable = change < tolerance
+            
+            if probe is not None:
+                value = self._run_probe(probe, OSC_RATE)
+                report["probe"].append(value)
+                if probe_tolerance is not None:
+                    stable &= previous["probe"] is not None and abs(value - previous["probe"]) < probe_tolerance
+                previous["probe"] = value
+                
+                # Baseline of the next chunk after the probe, so that its changes are not counted as sleep
+                previous["weights"] = self.get_weights('cxcx')["weights"].astype(float)
+            
+            previous["stable"] = previous["stable"] + 1 if stable else 0
+            logger.info(f"Sleep at {nest.biological_time - start_time:g} ms: relative cx-cx weight change {change:.2e}.")
+            
+            return previous["stable"] >= patience
+        
+        report["slept_ms"] = self.simulate_in_chunks(max_duration, chunk, check_convergence)
+        report["converged"] = previous["stable"] >= patience
+        
+        # Stop the sleep oscillation and go back to the awake regime
+        self.sleep_osc.set(stop=nest.biological_time)
+        self.set_awake_params()
+        
+        logger.info(f"Sleep {'converged' if report['converged'] else 'stopped'} after {report['slept_ms']:g} ms of {max_duration:g} ms.")
+        self.sleep_report = report
+        
+        return report
+    
+    def _run_probe(self, probe, osc_rate):
+        """
+        Call a probe of sleep_until_converged() in the awake regime: awake parameters, plasticity frozen, sleep 
+        oscillation muted and recorders gated for retrieval; then resume the sleep with the learning rates it had.
+        """
+        # Learning rates of the plastic synapses during sleep
+        plastic = [nest.GetConnections(getattr(self, f"{pre_name}_pop"), getattr(self, f"{post_name}_pop"), synapse_model=synapse_model)
+                   for pre_name, post_name, synapse_model in PLASTIC_PROJECTIONS.values()]
+        learning_rates = [np.atleast_1d(connections.get('lambda')).tolist() for connections in plastic]
+        
+        # Pause the sleep
+        self.sleep_osc.set(rate=0.0)
+        self.set_awake_params()
+        self.freeze_plasticity()
+        self.gate_recorders('retrieval')
+        
+        value = probe(self)
+        
+        # Resume the sleep
+        for connections, values in zip(plastic, learning_rates):
+            connections.set({"lambda": values})
+        self.set_sleep_params()
+        self.gate_recorders('sleep')
+        self.sleep_osc.set(rate=osc_rate)
+        
+        return value
+    
+    def weight_summary(self, projection, n_bins=20):
+        """
+        Summary statistics of the weights of a plastic projection: mean, standard deviation, histogram between 0 and 
+        Wmax, and block means between the groups of the populations (groups of 20 neurons in cx, single neurons in tc).
+        
+        :param projection: 'cxcx', 'cxtc' or 'tccx'.
+        :type: str
+        
+        :param n_bins: Number of bins of the histogram. Defaults to 20.
+        :type: int
+
+        Returns:
+            Dict: 'mean', 'std', 'histogram' (counts), 'bin_edges' and 'block_means' (n_pre_groups x n_post_groups).
+        """
+        # Declare variables
+        weights = self.get_weights(projection)
+        pre_name, post_name, _ = PLASTIC_PROJECTIONS[projection]
+        pre_group = self.SET_CX_NEURON if pre_name == 'cx' else 1
+        post_group = self.SET_CX_NEURON if post_name == 'cx' else 1
+        n_pre, n_post = weights["shape"][0] // pre_group, weights["shape"][1] // post_group
+        w_max = getattr(self, f"syn_dict_{projection}")["Wmax"]
+        
+        # Histogram
+        histogram, bin_edges = np.histogram(weights["weights"], bins=n_bins, range=(0.0, w_max))
+        
+        # Block means between groups
+        block = (weights["sources"] // pre_group).astype(np.int64) * n_post + weights["targets"] // post_group
+        block_sums = np.bincount(block, weights=weights["weights"], minlength=n_pre * n_post)
+        block_counts = np.bincount(block, minlength=n_pre * n_post)
+        block_means = np.divide(block_sums, block_counts, out=np.zeros(n_pre * n_post), where=block_counts > 0)
+        
+        return {"mean": float(weights["weights"].mean()) if len(weights["weights"]) else 0.0,
+                "std": float(weights["weights"].std()) if len(weights["weights"]) else 0.0,
+                "histogram": histogram,
+                "bin_edges": bin_edges,
+                "block_means": block_means.reshape(n_pre, n_post).astype(np.float32)}
+    
+    def record_weight_summary(self):
+        """
+        Append the summary statistics of the three plastic projections at the current time to self.weight_trace.
+        """
+        self.weight_trace.append({"time": nest.biological_time, 
+                                  **{projection: self.weight_summary(projection) for projection in PLASTIC_PROJECTIONS}})
+    
+    def simulate_tracked(self, duration, interval=1000.0):
+        """
+        Simulate for duration ms recording the weight summaries every interval ms (coarse weight trajectories with 
+        bounded memory, e.g. for the 600 s sleep phase).
+        
+        :param duration: Total time to simulate (ms).
+        :type: float
+        
+        :param interval: Time between two summaries (ms). Defaults to 1 s.
+        :type: float
+        """
+        self.simulate_in_chunks(duration, interval, self.record_weight_summary)
+
+    def _growth_syn_spec(self, projection, old_cx):
+        """
+        syn_spec of the synapses added to a plastic projection by add_groups(): the weight and Wmax of __init__ scaled 
+        for the current size of the pre population, and the alpha and lambda of the existing synapses, which hold the 
+        current regime (see set_sleep_params) and a frozen plasticity (see freeze_plasticity).
+        """
+        pre_name, post_name, synapse_model = PLASTIC_PROJECTIONS[projection]
+        syn_dict = getattr(self, f"syn_dict_{projection}")
+        n_pre = len(getattr(self, f"{pre_name}_pop"))
+        factor = n_pre / expected_indegree(self.connectivity[projection], n_pre) / self.weight_scales[projection]
+        
+        # Alpha and lambda of the projection before the growth
+        old_pre = old_cx if pre_name == 'cx' else getattr(self, f"{pre_name}_pop")
+        old_post = old_cx if post_name == 'cx' else getattr(self, f"{post_name}_pop")
+        existing = nest.GetConnections(old_pre, old_post, synapse_model=synapse_model)
+        if len(existing):
+            current = existing[0].get(['alpha', 'lambda'])
+        else:
+            current = {"alpha": syn_dict["alpha"], "lambda": nest.GetDefaults(synapse_model)['lambda']}
+        
+        return {"synapse_model": synapse_model,
+                "weight": syn_dict["weight"] * factor,
+                "Wmax": syn_dict["Wmax"] * factor,
+                "alpha": float(np.atleast_1d(current["alpha"])[0]),
+                "lambda": float(np.atleast_1d(current["lambda"])[0])}
+    
+    def _create_generator(self, model, n=1, params=None):
+        """
+        Create generators with a start and stop window, kept in self.generators so that reset() switches them off.
+        """
+        generator = nest.Create(model, n, params=params)
+        self.generators.append(generator)
+        
+        return generator
+    
+    def _connection_state(self, pre_pop, post_pop, synapse_model, keys):
+        """
+        Sources and targets (indices within the pre and post populations) and the given properties of the connections 
+        between two populations, all read with one get call.
+        """
+        connections = nest.GetConnections(pre_pop, post_pop, synapse_model=synapse_model)
+        status = connections.get(['source', 'target'] + list(keys))
+        
+        state = {"sources": node_indices(pre_pop, np.atleast_1d(status['source'])),
+                 "targets": node_indices(post_pop, np.atleast_1d(status['target']))}
+        
+        for key in keys:
+            state[key] = np.atleast_1d(np.asarray(status[key], dtype=float))
+        
+        return connections, state
+    
+    def _checkpoint_connections(self):
+        """
+        Connections stored in checkpoints: name, pre and post populations, synapse model and properties.
+        """
+        connections = [(projection, pre_name, post_name, synapse_model, CHECKPOINT_PLASTIC) 
+                       for projection, (pre_name, post_name, synapse_model) in PLASTIC_PROJECTIONS.items()]
+        connections.append(("incx", 'in', 'cx', 'static_synapse', CHECKPOINT_STATIC))
+        
+        return connections
+    
+    @profiled
+    def save_checkpoint(self, path):
+        """
+        Save the trained network to a compressed .npz file: population sizes, neuron state (V_m, w, conductances) and 
+        modified parameters (b), weights and alpha of all the plastic synapses, in -> cx weights, simulation time and 
+        parameters' regime ('awake' or 'sleep', e.g. after input_sleep). Restore it with Network.from_checkpoint().
+        
+        :param path: File to write.
+        :type: str
+        """
+        # Declare variables
+        arrays = {}
+        meta = {"n_train_images": self.n_train_images,
+                "sizes": {name: len(getattr(self, f"{name}_pop")) for name in ('cx', 'in', 'tc', 're')},
+                "connectivity": self.connectivity,
+                "time": self.checkpoint_time + nest.biological_time,
+                "regime": self.regime}
+        
+        # Neuron state and parameters
+        for name in ('cx', 'in', 'tc', 're'):
+            status = getattr(self, f"{name}_pop").get(list(CHECKPOINT_STATE + CHECKPOINT_PARAMS))
+            for key, values in status.items():
+                arrays[f"{name}.{key}"] = np.asarray(values, dtype=float)
+        
+        # Synapses
+        for connection_name, pre_name, post_name, synapse_model, keys in self._checkpoint_connections():
+            _, state = self._connection_state(getattr(self, f"{pre_name}_pop"), getattr(self, f"{post_name}_pop"), synapse_model, keys)
+            state["sources"] = state["sources"].astype(np.int32)
+            state["targets"] = state["targets"].astype(np.int32)
+            for key, values in state.items():
+                arrays[f"{connection_name}.{key}"] = values
+        
+        np.savez_compressed(path, meta=json.dumps(meta), **arrays)
+        
+        # Display result
+        logger.info(f"Checkpoint successfully saved to {path}.")
+    
+    @classmethod
+    def from_checkpoint(cls, path, **kwargs):
+        """
+        Build a network identical to the one saved with save_checkpoint(), without re-simulating it. The sparse plastic
+        projections are rebuilt with the connections of the checkpoint.
+        
+        :param path: Checkpoint file.
+        :type: str
+        
+        :param kwargs: Other arguments of the Network creation (e.g. weight_tracking). A connectivity, if given, must 
+                       be the one of the checkpoint.
+
+        Returns:
+            Network: the restored network.
+        """
+        with np.load(path) as checkpoint:
+            meta = json.loads(str(checkpoint["meta"]))
+            connectivity = meta.get("connectivity", {})
+            connections = {projection: (checkpoint[f"{projection}.sources"], checkpoint[f"{projection}.targets"])
+                           for projection, spec in connectivity.items() if spec["rule"] != 'all_to_all'}
+        
+        # The connectivity of the checkpoint, which a given one must match
+        requested = kwargs.pop("connectivity", None)
+        if requested is not None:
+            assert connectivity_specs(requested) == connectivity_specs(connectivity or None), "The connectivity differs from the one of the checkpoint."
+        
+        net = cls(meta["n_train_images"], connectivity=connectivity or None, connections=connections, **kwargs)
+        net.load_checkpoint(path)
+        
+        return net
+    
+    @profiled
+    def load_checkpoint(self, path):
+        """
+        Restore the state saved with save_checkpoint() into this network, which must have the same populations and 
+        connections. NEST cannot set the kernel time, so the simulation time of the checkpoint is kept in 
+        self.checkpoint_time. The spike history of the neurons (STDP traces) is not restored. The restored parameters 
+        are the ones of the saved regime, kept in self.regime: call set_awake_params() after a sleep checkpoint to 
+        retrieve with the awake parameters.
+        
+        :param path: Checkpoint file.
+        :type: str
+        """
+        with np.load(path) as checkpoint:
+            meta = json.loads(str(checkpoint["meta"]))
+            
+            # Assert the network matches the checkpoint
+            for name, size in meta["sizes"].items():
+                assert len(getattr(self, f"{name}_pop")) == size, f"The {name} population has not {size} neurons as in the checkpoint."
+            
+            # Neuron state and parameters
+            for name in ('cx', 'in', 'tc', 're'):
+                getattr(self, f"{name}_pop").set({key: checkpoint[f"{name}.{key}"].tolist() for key in CHECKPOINT_STATE + CHECKPOINT_PARAMS})
+            
+            # Synapses: match the connections by (source, target)
+            for connection_name, pre_name, post_name, synapse_model, keys in self._checkpoint_connections():
+                connections, state = self._connection_state(getattr(self, f"{pre_name}_pop"), getattr(self, f"{post_name}_pop"), synapse_model, ())
+                n_post = meta["sizes"][post_name]
+                
+                saved_keys = checkpoint[f"{connection_name}.sources"].astype(np.int64) * n_post + checkpoint[f"{connection_name}.targets"]
+                keys_now = state["sources"] * n_post + state["targets"]
+                saved_order = np.argsort(saved_keys, kind='stable')
+                order = np.argsort(keys_now, kind='stable')
+                assert np.array_equal(saved_keys[saved_order], keys_now[order]), f"The {connection_name} connections differ from the checkpoint."
+                
+                values = {}
+                for key in keys:
+                    if f"{connection_name}.{key}" in checkpoint:
+                        restored = np.empty(len(order))
+                        restored[order] = checkpoint[f"{connection_name}.{key}"][saved_order]
+                        values[key] = restored.tolist()
+                
+                connections.set(values)
+        
+        self.checkpoint_time = meta["time"]
+        self.regime = meta.get("regime", 'awake')
+        
+        # Display result
+        logger.info(f"Checkpoint successfully loaded from {path}.")
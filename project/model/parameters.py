@@ -0,0 +1,120 @@
+# Default recording configuration of every population, see Network.connect_all_devices()
+RECORDING_DEFAULTS = {
+    "voltage": True,                # Record V_m with a multimeter
+    "spikes": True,                 # Record spikes with a spike recorder
+    "interval": 1.0,                # Sampling interval of the multimeter (ms)
+    "neurons": None,                # Recorded neurons: None (all), a number of evenly spaced neurons (0: none) or a list of indices
+    "phases": None,                 # Phases in which the devices record, e.g. ('retrieval',); None records always
+    "record_to": 'memory',          # Recording backend: 'memory', or 'ascii' to stream the events to disk (see read_recording)
+}
+
+# Plastic projections of the network: (pre population, post population, synapse model)
+PLASTIC_PROJECTIONS = {
+    "cxcx": ('cx', 'cx', 'stdp_synapse_cxcx'),
+    "cxtc": ('cx', 'tc', 'stdp_synapse_cxtc'),
+    "tccx": ('tc', 'cx', 'stdp_synapse_tccx'),
+}
+
+# Population sizes: cx grows with the training set (one group of CX_GROUP_SIZE neurons per image), the others are fixed
+CX_GROUP_SIZE = 20
+POPULATION_SIZES = {
+    "in": 200,
+    "tc": 324,                      # Dimension of the feature vectors produced by the pre-processing of visual input
+    "re": 200,
+}
+
+# Connectivity rules of the plastic projections, see Network(connectivity=...)
+CONNECTIVITY_RULES = ('all_to_all', 'pairwise_bernoulli', 'fixed_indegree')
+
+# Approximate memory costs used by estimate_network()
+MEMORY_COSTS = {
+    "plastic_synapse": 104,         # Bytes per stdp_synapse: weight, Wmax, alpha, traces and delay, plus its source entry
+    "static_synapse": 24,           # Bytes per static_synapse, plus its source entry
+    "neuron": 2000,                 # Bytes per aeif_cond_alpha neuron, with its spike history for STDP
+    "kernel": 100 * 2**20,          # Bytes of the NEST kernel itself
+}
+
+
+def connectivity_specs(connectivity=None):
+    """
+    Connection rule of every plastic projection.
+
+    :param connectivity: None or 'all_to_all' (default, every projection all-to-all); one rule for all the projections,
+                         e.g. {"rule": 'pairwise_bernoulli', "p": 0.1} or {"rule": 'fixed_indegree', "indegree": 100}; or
+                         one rule per projection, e.g. {"cxcx": {"rule": 'fixed_indegree', "indegree": 200}} (the missing
+                         projections stay all-to-all).
+    :type: dict
+
+    Returns:
+        Dict: the conn_spec of every projection of PLASTIC_PROJECTIONS.
+    """
+    if connectivity is None or connectivity == 'all_to_all':
+        connectivity = {}
+
+    assert isinstance(connectivity, dict), "Type None, 'all_to_all' or a dict of connection rules."
+
+    if "rule" in connectivity:
+        connectivity = {projection: connectivity for projection in PLASTIC_PROJECTIONS}
+
+    assert set(connectivity) <= set(PLASTIC_PROJECTIONS), f"Type projections among {list(PLASTIC_PROJECTIONS)}."
+
+    specs = {}
+    for projection in PLASTIC_PROJECTIONS:
+        spec = connectivity.get(projection, {"rule": 'all_to_all'})
+        assert isinstance(spec, dict) and "rule" in spec, f"Type a dict with a rule for the {projection} projection."
+        spec = dict(spec)
+        assert spec["rule"] in CONNECTIVITY_RULES, f"Type a rule among {CONNECTIVITY_RULES}."
+
+        if spec["rule"] == 'pairwise_bernoulli':
+            assert 0 < spec["p"] <= 1, "Type a probability p in (0, 1]."
+        elif spec["rule"] == 'fixed_indegree':
+            assert isinstance(spec["indegree"], int) and spec["indegree"] > 0, "Type an int indegree higher than 0."
+
+        specs[projection] = spec
+
+    return specs
+
+
+def expected_indegree(spec, n_pre):
+    """
+    Expected number of incoming connections of a postsynaptic neuron under a connection rule.
+    """
+    if spec["rule"] == 'pairwise_bernoulli':
+        return spec["p"] * n_pre
+    if spec["rule"] == 'fixed_indegree':
+        return spec["indegree"]
+
+    return n_pre
+
+
+def estimate_network(n_train_images, connectivity=None):
+    """
+    Predict the number of neurons and synapses of a network and the memory it needs, without creating it. The memory is
+    a rough estimate from MEMORY_COSTS; recorded events and weight recorders are not included.
+
+    :param n_train_images: Number of training images (size of the cx population / 20).
+    :type: int
+
+    :param connectivity: Connectivity of the plastic projections (see connectivity_specs).
+    :type: dict
+
+    Returns:
+        Dict: the population sizes, the synapses of every projection, the plastic and static totals and the memory (MB).
+    """
+    sizes = dict(POPULATION_SIZES, cx=CX_GROUP_SIZE * n_train_images)
+    specs = connectivity_specs(connectivity)
+
+    # Synapses: plastic projections and the all-to-all static ones
+    synapses = {projection: int(round(expected_indegree(specs[projection], sizes[pre_name]) * sizes[post_name]))
+                for projection, (pre_name, post_name, _) in PLASTIC_PROJECTIONS.items()}
+    static = (2 * sizes["in"] * sizes["cx"] + 2 * sizes["tc"] * sizes["re"] + sizes["in"] ** 2 + sizes["re"] ** 2)
+
+    plastic = sum(synapses.values())
+    memory = (plastic * MEMORY_COSTS["plastic_synapse"] + static * MEMORY_COSTS["static_synapse"]
+              + sum(sizes.values()) * MEMORY_COSTS["neuron"] + MEMORY_COSTS["kernel"])
+
+    return {"sizes": sizes,
+            "synapses": synapses,
+            "plastic_synapses": plastic,
+            "static_synapses": static,
+            "memory_mb": memory / 2**20}
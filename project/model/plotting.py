@@ -0,0 +1,176 @@
+import numpy as np
+
+from .analysis import population_layout, contiguous_senders
+
+# Plots of very large recordings (e.g. the 600 s sleep phase) in bounded memory: the spikes are rasterized into a
+# (neurons x time) density image and the V_m traces are min/max-decimated to the resolution of the screen. Every function
+# takes an iterable of chunks (dicts of arrays with 'senders', 'times' and, for the multimeters, 'V_m'), e.g. from
+# Network.read_recording(), recordings.read_chunks() on the files of a previous run, or [device.get('events')], and only
+# keeps the image in memory. matplotlib is only imported to draw.
+
+
+def spike_density(chunks, first_id, n_neurons, t_start, t_stop, time_bins=1000, neuron_bins=500):
+    """
+    Spike density image of a population: number of spikes of every block of neurons in every time bin.
+
+    :param chunks: Spike chunks of the population.
+    :type: iterable
+
+    :param first_id: Node id of the first neuron of the population.
+    :type: int
+
+    :param n_neurons: Size of the population.
+    :type: int
+
+    :param t_start: Start of the image (ms).
+    :type: float
+
+    :param t_stop: End of the image (ms).
+    :type: float
+
+    :param time_bins: Number of time bins (columns). Defaults to 1000.
+    :type: int
+
+    :param neuron_bins: Number of neuron blocks (rows), at most one per neuron. Defaults to 500.
+    :type: int
+
+    Returns:
+        np.ndarray: counts with shape (neuron_bins, time_bins).
+    """
+    neuron_bins = min(neuron_bins, n_neurons)
+    image = np.zeros(neuron_bins * time_bins, dtype=np.int64)
+
+    for chunk in chunks:
+        rows = (np.asarray(chunk["senders"], dtype=np.int64) - first_id) * neuron_bins // n_neurons
+        columns = np.floor((np.asarray(chunk["times"], dtype=float) - t_start) * time_bins / (t_stop - t_start)).astype(np.int64)
+
+        keep = (rows >= 0) & (rows < neuron_bins) & (columns >= 0) & (columns < time_bins)
+        image += np.bincount(rows[keep] * time_bins + columns[keep], minlength=neuron_bins * time_bins)
+
+    return image.reshape(neuron_bins, time_bins)
+
+
+def minmax_envelope(chunks, sender, t_start, t_stop, n_bins=2000):
+    """
+    Min/max decimation of the V_m trace of one neuron: minimum and maximum of the samples in every time bin, which keeps
+    the spikes and the slow oscillations visible at any zoom level.
+
+    :param chunks: Multimeter chunks.
+    :type: iterable
+
+    :param sender: Node id of the neuron.
+    :type: int
+
+    :param n_bins: Number of time bins, about the width of the plot in pixels. Defaults to 2000.
+    :type: int
+
+    Returns:
+        Tuple: the centers of the bins (ms), the minima and the maxima (NaN in the bins without samples).
+    """
+    mins = np.full(n_bins, np.inf)
+    maxs = np.full(n_bins, -np.inf)
+
+    for chunk in chunks:
+        mine = np.asarray(chunk["senders"]) == sender
+        bins = np.floor((np.asarray(chunk["times"], dtype=float)[mine] - t_start) * n_bins / (t_stop - t_start)).astype(np.int64)
+        values = np.asarray(chunk["V_m"], dtype=float)[mine]
+
+        keep = (bins >= 0) & (bins < n_bins)
+        np.minimum.at(mins, bins[keep], values[keep])
+        np.maximum.at(maxs, bins[keep], values[keep])
+
+    empty = np.isinf(mins)
+    mins[empty] = np.nan
+    maxs[empty] = np.nan
+
+    return t_start + (np.arange(n_bins) + 0.5) * (t_stop - t_start) / n_bins, mins, maxs
+
+
+def _axes(ax):
+    """
+    Given axes, or new ones.
+    """
+    import matplotlib.pyplot as plt
+
+    return plt.subplots()[1] if ax is None else ax
+
+
+def _pixels(ax):
+    """
+    Width and height of the axes in pixels.
+    """
+    box = ax.get_window_extent()
+
+    return max(int(box.width), 1), max(int(box.height), 1)
+
+
+def plot_density_raster(chunks, first_id, n_neurons, t_start, t_stop, ax=None, time_bins=None, neuron_bins=None, cmap='gray_r'):
+    """
+    Raster plot drawn as a density image instead of one marker per spike (see spike_density). By default the image has
+    one bin per pixel of the axes.
+
+    Returns:
+        Axes: the axes of the plot.
+    """
+    ax = _axes(ax)
+    width, height = _pixels(ax)
+
+    image = spike_density(chunks, first_id, n_neurons, t_start, t_stop, time_bins or width, neuron_bins or height)
+    ax.imshow(image, aspect='auto', origin='lower', interpolation='nearest', cmap=cmap,
+              extent=(t_start, t_stop, 0, n_neurons))
+    ax.set_xlabel('Time (ms)')
+    ax.set_ylabel('Neuron')
+
+    return ax
+
+
+def plot_voltage(chunks, sender, t_start, t_stop, ax=None, n_bins=None, color='k'):
+    """
+    V_m trace of one neuron drawn from its min/max envelope (see minmax_envelope). By default the envelope has one bin per
+    pixel of the axes.
+
+    Returns:
+        Axes: the axes of the plot.
+    """
+    ax = _axes(ax)
+
+    centers, mins, maxs = minmax_envelope(chunks, sender, t_start, t_stop, n_bins or _pixels(ax)[0])
+    ax.fill_between(centers, mins, maxs, color=color, linewidth=0.5, step='mid')
+    ax.set_xlabel('Time (ms)')
+    ax.set_ylabel('V_m (mV)')
+
+    return ax
+
+
+def raster(net, name, t_start, t_stop, ax=None, **kwargs):
+    """
+    Density raster of a population of the network, read chunk by chunk from its spike recorder (see
+    Network.read_recording), e.g. raster(net, 'cx', 18000, 618000) for the sleep phase.
+
+    Returns:
+        Axes: the axes of the plot.
+    """
+    first_id, n_neurons = population_layout(net, name)
+    chunks = ({**chunk, "senders": contiguous_senders(net, name, chunk["senders"])}
+              for chunk in net.read_recording(name, 'spikes', t_start=t_start, t_stop=t_stop))
+    ax = plot_density_raster(chunks, first_id, n_neurons, t_start, t_stop, ax, **kwargs)
+    ax.set_title(f"{name} population")
+
+    return ax
+
+
+def voltage(net, name, t_start, t_stop, neuron=0, ax=None, **kwargs):
+    """
+    Decimated V_m trace of one neuron of a population, read chunk by chunk from its multimeter.
+
+    :param neuron: Index of the neuron within the population; it must be recorded (see Network.recorded_neurons).
+    :type: int
+
+    Returns:
+        Axes: the axes of the plot.
+    """
+    sender = getattr(net, f"{name}_pop")[neuron].get('global_id')
+    ax = plot_voltage(net.read_recording(name, 'voltage', t_start=t_start, t_stop=t_stop), sender, t_start, t_stop, ax, **kwargs)
+    ax.set_title(f"{name} neuron {neuron}")
+
+    return ax
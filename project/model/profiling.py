@@ -0,0 +1,110 @@
+import csv
+import json
+import time
+import functools
+
+from contextlib import contextmanager
+
+from .lazy import LazyModule
+
+# Imported at its first use, see LazyModule
+nest = LazyModule('nest')
+
+# Kernel statistics captured before and after every profiled section, when the NEST version provides them
+KERNEL_COUNTERS = (
+    'biological_time',
+    'network_size',
+    'num_connections',
+    'local_spike_counter',
+    'time_construction_create',
+    'time_construction_connect',
+    'time_simulate',
+    'time_update',
+    'time_communicate_prepare',
+    'time_gather_spike_data',
+    'time_collocate_spike_data',
+    'time_communicate_spike_data',
+    'time_deliver_spike_data',
+)
+
+
+class Profiler:
+    """
+        The Profiler class times sections of a run (Network methods and simulation phases) and captures the NEST kernel
+        statistics before and after each of them, as a structured trace that can be written to JSON or CSV.
+    """
+
+    def __init__(self):
+        """
+        Profiler creation.
+        """
+        self.trace = []
+        self._depth = 0
+
+    def kernel_counters(self):
+        """
+        Current value of the kernel statistics of KERNEL_COUNTERS available in this NEST version.
+
+        Returns:
+            Dict: the kernel statistics.
+        """
+        status = nest.GetKernelStatus()
+
+        return {key: status[key] for key in KERNEL_COUNTERS if key in status}
+
+    @contextmanager
+    def section(self, name, **info):
+        """
+        Time a section of code and record its kernel statistics. Sections can be nested; the depth is recorded.
+
+        :param name: Name of the section, e.g. the Network method or 'simulate:sleep'.
+        :type: str
+
+        :param info: Additional fields of the record.
+        """
+        record = {"name": name, "depth": self._depth, **info}
+        before = self.kernel_counters()
+        start = time.perf_counter()
+        self._depth += 1
+
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record["wall_s"] = time.perf_counter() - start
+            after = self.kernel_counters()
+            record.update({f"{key}_before": value for key, value in before.items()})
+            record.update({f"delta_{key}": after[key] - value for key, value in before.items() if key in after})
+            self.trace.append(record)
+
+    def write(self, path):
+        """
+        Write the trace to a .json or .csv file.
+
+        :param path: File to write; the format follows the extension.
+        :type: str
+        """
+        if path.endswith('.csv'):
+            columns = list(dict.fromkeys(key for record in self.trace for key in record))
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.trace, f, indent=4)
+
+
+def profiled(method):
+    """
+    Decorator of the Network methods: time the method with the network profiler, if any.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self, 'profiler', None) is None:
+            return method(self, *args, **kwargs)
+
+        with self.profiler.section(method.__name__):
+            return method(self, *args, **kwargs)
+
+    return wrapper
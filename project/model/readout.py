@@ -0,0 +1,128 @@
+import numpy as np
+
+# Classification of the test images from the spike counts of a retrieval run, as a (n_images, cx_n) matrix (e.g. from
+# evaluate_checkpoint(..., group_size=1) or analysis.presentation_responses). Every group of 20 cx neurons encodes one
+# training image, whose label is the label of the group. Images without any cx spike are not classified: their
+# prediction is -1.
+
+
+def group_responses(counts, group_size=20):
+    """
+    Spike counts of every group of group_size cx neurons in every test image.
+
+    :param counts: Spike counts with shape (n_images, n_neurons); already per group when group_size is 1.
+    :type: np.ndarray
+
+    Returns:
+        np.ndarray: counts with shape (n_images, n_neurons // group_size).
+    """
+    counts = np.asarray(counts)
+
+    return counts.reshape(len(counts), -1, group_size).sum(axis=2)
+
+
+def class_responses(counts, group_labels, n_classes=10, group_size=20):
+    """
+    Mean response of the groups of every class in every test image.
+
+    :param group_labels: Label of the training image encoded by every group, e.g. np.repeat(np.arange(10), n_ranks) when
+                         the images were trained class by class.
+    :type: np.ndarray
+
+    Returns:
+        np.ndarray: mean group counts with shape (n_images, n_classes).
+    """
+    group_labels = np.asarray(group_labels)
+    one_hot = np.zeros((len(group_labels), n_classes))
+    one_hot[np.arange(len(group_labels)), group_labels] = 1.0
+
+    return group_responses(counts, group_size) @ one_hot / np.maximum(one_hot.sum(axis=0), 1.0)
+
+
+def _predict(responses, labels=None):
+    """
+    Label of the max response of every image (the first one in case of ties), -1 for the images without spikes.
+    """
+    winners = np.argmax(responses, axis=1)
+    predictions = winners if labels is None else np.asarray(labels)[winners]
+
+    return np.where(responses.max(axis=1) > 0, predictions, -1)
+
+
+def supervised_predictions(counts, group_labels, n_classes=10, group_size=20):
+    """
+    Class output: the class whose groups respond the most, on average, to every test image.
+
+    Returns:
+        np.ndarray: predicted labels with shape (n_images,).
+    """
+    return _predict(class_responses(counts, group_labels, n_classes, group_size))
+
+
+def unsupervised_predictions(counts, group_labels, group_size=20):
+    """
+    Max-responding group: the label of the group that fires the most in every test image.
+
+    Returns:
+        np.ndarray: predicted labels with shape (n_images,).
+    """
+    return _predict(group_responses(counts, group_size), group_labels)
+
+
+def accuracy(predictions, labels):
+    """
+    Fraction of the test images classified correctly; the unclassified images count as errors.
+    """
+    return float(np.mean(np.asarray(predictions) == np.asarray(labels)))
+
+
+def confusion_matrix(predictions, labels, n_classes=10):
+    """
+    Confusion matrix: number of test images of every true class (rows) predicted as every class (columns). The last
+    column counts the unclassified images.
+
+    Returns:
+        np.ndarray: counts with shape (n_classes, n_classes + 1).
+    """
+    predictions = np.where(np.asarray(predictions) < 0, n_classes, predictions)
+
+    return np.bincount(np.asarray(labels) * (n_classes + 1) + predictions,
+                       minlength=n_classes * (n_classes + 1)).reshape(n_classes, n_classes + 1)
+
+
+def classification_report(counts, labels, group_labels, n_classes=10, group_size=20):
+    """
+    Supervised and unsupervised classification of a test set.
+
+    :param counts: Spike counts of the retrieval run with shape (n_images, n_neurons).
+    :type: np.ndarray
+
+    :param labels: True labels of the test images.
+    :type: np.ndarray
+
+    :param group_labels: Label of the training image encoded by every group.
+    :type: np.ndarray
+
+    Returns:
+        Dict: predictions, accuracy and confusion matrix of the 'supervised' and 'unsupervised' readouts.
+    """
+    report = {}
+
+    for readout, predictions in (('supervised', supervised_predictions(counts, group_labels, n_classes, group_size)),
+                                 ('unsupervised', unsupervised_predictions(counts, group_labels, group_size))):
+        report[readout] = {"predictions": predictions,
+                           "accuracy": accuracy(predictions, labels),
+                           "confusion": confusion_matrix(predictions, labels, n_classes)}
+
+    return report
+
+
+def sleep_comparison(pre_counts, post_counts, labels, group_labels, n_classes=10, group_size=20):
+    """
+    Classification of the same test set before and after sleep.
+
+    Returns:
+        Dict: the classification_report() of the 'pre' and 'post' sleep retrieval runs.
+    """
+    return {"pre": classification_report(pre_counts, labels, group_labels, n_classes, group_size),
+            "post": classification_report(post_counts, labels, group_labels, n_classes, group_size)}
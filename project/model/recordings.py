@@ -0,0 +1,125 @@
+import os
+import glob
+import itertools
+
+import numpy as np
+
+# Compact dtypes of the recorded columns; other recorded quantities are read as float32
+COLUMN_DTYPES = {
+    "sender": np.int32,
+    "time_ms": np.float32,
+    "time_step": np.int64,
+    "offset": np.float32,
+}
+
+# Names of the columns in the returned arrays, matching the keys of nest device events
+COLUMN_NAMES = {
+    "sender": "senders",
+    "time_ms": "times",
+    "time_step": "times",
+}
+
+
+def device_files(label, data_path='', data_prefix=''):
+    """
+    Files written by a device recording to the 'ascii' backend: one file per virtual process, named
+    <data_prefix><label>-<node id>-<vp>.dat in data_path.
+
+    :param label: Label of the device.
+    :type: str
+
+    :param data_path: Kernel data_path (nest.data_path). Defaults to the working directory.
+    :type: str
+
+    :param data_prefix: Kernel data_prefix (nest.data_prefix).
+    :type: str
+
+    Returns:
+        List: the paths of the files, sorted.
+    """
+    return sorted(glob.glob(os.path.join(data_path or '.', f"{glob.escape(data_prefix + label)}-*.dat")))
+
+
+def _read_header(f):
+    """
+    Skip the comment lines of an ascii recording file and return the names of its columns.
+    """
+    for line in f:
+        if not line.startswith('#'):
+            return line.split()
+
+    return []
+
+
+def read_chunks(files, chunk_size=1000000, t_start=None, t_stop=None):
+    """
+    Read ascii recording files chunk by chunk, without loading them whole.
+
+    Every file is read in order, so the chunks of a file are sorted by time; with several threads the chunks of different
+    files interleave in time. When t_stop is given, reading a file stops at the first chunk past t_stop.
+
+    :param files: Paths of the files (see device_files).
+    :type: list
+
+    :param chunk_size: Maximum number of rows per chunk. Defaults to 1e6.
+    :type: int
+
+    :param t_start: Only keep the events after t_start (ms).
+    :type: float
+
+    :param t_stop: Only keep the events up to t_stop (ms).
+    :type: float
+
+    Returns:
+        Generator: dicts of arrays, with 'senders' (int32), 'times' (float32) and the recorded quantities (float32).
+    """
+    for path in files:
+        with open(path) as f:
+            columns = _read_header(f)
+            if not columns:
+                continue
+
+            dtype = [(column, COLUMN_DTYPES.get(column, np.float32)) for column in columns]
+            time_column = "time_ms" if "time_ms" in columns else "time_step"
+
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+
+                data = np.loadtxt(lines, dtype=dtype, ndmin=1)
+                times = data[time_column]
+
+                # Keep the requested time window
+                keep = np.ones(len(data), dtype=bool)
+                if t_start is not None:
+                    keep &= times > t_start
+                if t_stop is not None:
+                    keep &= times <= t_stop
+
+                if keep.any():
+                    yield {COLUMN_NAMES.get(column, column): data[column][keep] for column in columns}
+
+                if t_stop is not None and times[-1] > t_stop:
+                    break
+
+
+def read_events(files, t_start=None, t_stop=None):
+    """
+    Read all the events of ascii recording files in a time window, as compact arrays.
+
+    :param files: Paths of the files (see device_files).
+    :type: list
+
+    Returns:
+        Dict: arrays with 'senders' (int32), 'times' (float32) and the recorded quantities (float32), sorted by time.
+    """
+    chunks = list(read_chunks(files, t_start=t_start, t_stop=t_stop))
+
+    if not chunks:
+        return {"senders": np.array([], dtype=np.int32), "times": np.array([], dtype=np.float32)}
+
+    events = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    order = np.argsort(events["times"], kind='stable')
+
+    return {key: values[order] for key, values in events.items()}
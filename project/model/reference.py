@@ -0,0 +1,598 @@
+import logging
+import numbers
+
+import numpy as np
+
+from .parameters import (RECORDING_DEFAULTS, PLASTIC_PROJECTIONS, CX_GROUP_SIZE, POPULATION_SIZES,
+                         connectivity_specs, expected_indegree, estimate_network)
+
+logger = logging.getLogger(__name__)
+
+# Parameters of the aeif_cond_alpha neurons: NEST defaults, with the b, V_peak and t_ref set by Network
+AEIF_PARAMS = {
+    "C_m": 281.0,                   # pF
+    "g_L": 30.0,                    # nS
+    "E_L": -70.6,                   # mV
+    "V_th": -50.4,                  # mV
+    "Delta_T": 2.0,                 # mV
+    "tau_w": 144.0,                 # ms
+    "a": 4.0,                       # nS
+    "b": 0.01,                      # pA
+    "V_reset": -60.0,               # mV
+    "V_peak": -40.4,                # mV, V_th + 5 * Delta_T
+    "t_ref": 2.0,                   # ms
+    "E_ex": 0.0,                    # mV
+    "E_in": -85.0,                  # mV
+    "tau_syn_ex": 0.2,              # ms
+    "tau_syn_in": 2.0,              # ms
+    "I_e": 0.0,                     # pA
+    "tau_minus": 20.0,              # ms, postsynaptic STDP trace
+}
+
+# Parameters of the stdp_synapse (NEST defaults)
+STDP_PARAMS = {
+    "tau_plus": 20.0,               # ms, presynaptic STDP trace
+    "lambda": 0.01,                 # Learning rate
+    "mu_plus": 1.0,                 # Weight dependence of the potentiation
+    "mu_minus": 1.0,                # Weight dependence of the depression
+}
+
+# Static projections of the network: (pre population, post population)
+STATIC_PROJECTIONS = {
+    "incx": ('in', 'cx'),
+    "cxin": ('cx', 'in'),
+    "tcre": ('tc', 're'),
+    "retc": ('re', 'tc'),
+    "inin": ('in', 'in'),
+    "rere": ('re', 're'),
+}
+
+# External signals: target population and weight of the generators compiled from a Schedule
+SIGNALS = {
+    "train": ('tc', 8.0),
+    "context": ('cx', 15.0),
+    "inhib": ('in', 5.0),
+    "sleep": ('cx', 1.0),
+}
+
+# State arrays of the reference engine stored by ReferenceNetwork.store_state()
+NEURON_STATE = ('b', 'V_m', 'w', 'g_ex', 'dg_ex', 'g_in', 'dg_in', 'refractory', 'k_plus', 'k_minus', 'in_transit')
+
+
+class Population:
+    """
+        Contiguous block of neuron ids, with the few NodeCollection methods used on the Network populations (len,
+        indexing, tolist and get('global_id')), so that the analysis functions work on both engines.
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return Population(np.atleast_1d(self.ids[index]))
+
+    def tolist(self):
+        return self.ids.tolist()
+
+    def get(self, key):
+        assert key == 'global_id', "Only 'global_id' is available."
+
+        return int(self.ids[0]) if len(self.ids) == 1 else self.ids.tolist()
+
+
+class Recorder:
+    """
+        In-memory recorder (spike recorder or V_m multimeter) of the reference engine, read like a NEST device with
+        get('events') or get('n_events').
+    """
+
+    def __init__(self, neurons, interval=None, phases=None):
+        self.neurons = np.asarray(neurons, dtype=np.int64)      # Indices in the state arrays of the engine
+        self.interval = interval                                # Sampling interval in steps, None for spikes
+        self.phases = phases
+        self.active = True
+        self.chunks = []
+
+    def get(self, key):
+        events = {"senders": np.concatenate([c[0] for c in self.chunks]) if self.chunks else np.array([], dtype=np.int32),
+                  "times": np.concatenate([c[1] for c in self.chunks]) if self.chunks else np.array([], dtype=np.float32)}
+        if self.interval is not None:
+            events["V_m"] = np.concatenate([c[2] for c in self.chunks]) if self.chunks else np.array([], dtype=np.float32)
+
+        if key == 'n_events':
+            return len(events["senders"])
+
+        assert key == 'events', "Type 'events' or 'n_events'."
+
+        return events
+
+
+class ReferenceNetwork:
+    """
+        Vectorized NumPy reference engine of the thalamo-cortical network, without NEST.
+
+        It has the populations, connections and parameters of Network and the same interface for protocols
+        (compile_schedule, run_schedule, sleep and awake parameters, freeze_plasticity), recordings (connect_all_devices,
+        spikes_<population> and mult_<population>) and weights (get_weights), so that small runs can be checked and
+        iterated on machines without NEST.
+
+        The whole network is advanced with fixed-step array updates: forward Euler for V_m and w, exact propagation of
+        the alpha conductances, a ring buffer for the 1 ms delay of all the connections and online pre/post traces for
+        the STDP. Plastic projections are dense weight matrices (with a mask for the sparse rules); the static ones are
+        all-to-all with a uniform weight, so their input is the number of presynaptic spikes times the weight. Results
+        agree with NEST statistically (rates, responses), not spike by spike; see benchmarks/reference_engine.py.
+    """
+
+    def __init__(self, n_train_images, kernel=None, connectivity=None, store_states=False):
+        """
+        Network creation, as in Network.
+
+        :param n_train_images: Number of training images (size of the cx population / 20).
+        :type: int
+
+        :param kernel: Engine configuration: "seed" of the random number generator and "resolution" (ms, default 0.1);
+                       the other keys of KERNEL_OPTIONS are ignored.
+        :type: dict
+
+        :param connectivity: Connectivity of the plastic projections (see connectivity_specs). The sparse rules are
+                             drawn without multapses.
+        :type: dict
+
+        :param store_states: Store the 'initial' and 'trained' states for reset(), as in Network. Defaults to False.
+        :type: bool
+        """
+        assert isinstance(n_train_images, int), "No size of the pyramidal neuron (cx) population provided."
+
+        # Declare params of static synapses
+        W_IN_CX = -4
+        W_CX_IN = 60
+        W_TC_RE = 10
+        W_RE_TC = -10
+        W_IN_IN = -1
+        W_RE_RE = -1
+
+        # Declare params of STDP synapses
+        W_MAX = {"cxcx": 150.0, "cxtc": 130.0, "tccx": 5.5}      # Max weight values of the plastic projections
+        W_INIT = 1.0                                            # Initial weight value for the stdp synapses
+        ALPHA_SYM = 1.0                                         # Alpha of the symmetric STDP synapse
+        DELAY = 1.0                                             # Delay of all the connections (ms)
+
+        # Engine configuration
+        kernel = dict(kernel or {})
+        self.kernel = kernel
+        self.rng = np.random.default_rng(kernel.get("seed"))
+        self.resolution = kernel.get("resolution", 0.1)
+        self.steps = 0
+
+        # Declare populations, with the node ids NEST would give them
+        self.SET_CX_NEURON = CX_GROUP_SIZE
+        self.n_train_images = n_train_images
+        self.IN_N = POPULATION_SIZES["in"]
+        self.TC_N = POPULATION_SIZES["tc"]
+        self.RE_N = POPULATION_SIZES["re"]
+        self.cx_n = self.SET_CX_NEURON * n_train_images
+
+        self.slices = {}
+        first = 0
+        for name, size in (('cx', self.cx_n), ('in', self.IN_N), ('tc', self.TC_N), ('re', self.RE_N)):
+            self.slices[name] = slice(first, first + size)
+            setattr(self, f"{name}_pop", Population(np.arange(first, first + size) + 1))
+            first += size
+        self.n_neurons = first
+
+        # Neuron state
+        self.b = np.full(self.n_neurons, AEIF_PARAMS["b"])
+        self.V_m = np.full(self.n_neurons, AEIF_PARAMS["E_L"])
+        self.w = np.zeros(self.n_neurons)
+        self.g_ex = np.zeros(self.n_neurons)
+        self.dg_ex = np.zeros(self.n_neurons)
+        self.g_in = np.zeros(self.n_neurons)
+        self.dg_in = np.zeros(self.n_neurons)
+        self.refractory = np.zeros(self.n_neurons, dtype=np.int64)      # Remaining refractory steps
+
+        # Static synapses
+        self.static_weights = {"incx": W_IN_CX, "cxin": W_CX_IN, "tcre": W_TC_RE,
+                               "retc": W_RE_TC, "inin": W_IN_IN, "rere": W_RE_RE}
+
+        # STDP synapses: dense weight matrices (pre, post), rescaled for the sparse rules as in Network
+        self.connectivity = connectivity_specs(connectivity)
+        self.estimate = estimate_network(n_train_images, self.connectivity)
+        self.weights = {}
+        self.masks = {}
+        self.stdp = {}
+
+        for projection, (pre_name, post_name, _) in PLASTIC_PROJECTIONS.items():
+            n_pre, n_post = len(getattr(self, f"{pre_name}_pop")), len(getattr(self, f"{post_name}_pop"))
+            spec = self.connectivity[projection]
+            scale = n_pre / expected_indegree(spec, n_pre)
+
+            if spec["rule"] == 'pairwise_bernoulli':
+                self.masks[projection] = self.rng.random((n_pre, n_post)) < spec["p"]
+            elif spec["rule"] == 'fixed_indegree':
+                indegree = min(spec["indegree"], n_pre)
+                sources = np.argsort(self.rng.random((n_pre, n_post)), axis=0)[:indegree]
+                self.masks[projection] = np.zeros((n_pre, n_post), dtype=bool)
+                self.masks[projection][sources, np.arange(n_post)] = True
+            else:
+                self.masks[projection] = None
+
+            mask = 1.0 if self.masks[projection] is None else self.masks[projection]
+            self.weights[projection] = W_INIT * scale * mask * np.ones((n_pre, n_post))
+            self.stdp[projection] = {"Wmax": W_MAX[projection] * scale, "alpha": ALPHA_SYM, "lambda": STDP_PARAMS["lambda"]}
+
+        # STDP traces: presynaptic (at spike arrival) and postsynaptic, per neuron
+        self.k_plus = np.zeros(self.n_neurons)
+        self.k_minus = np.zeros(self.n_neurons)
+
+        # Spikes in transit, one row per step of delay
+        self.delay_steps = int(round(DELAY / self.resolution))
+        self.in_transit = np.zeros((self.delay_steps, self.n_neurons), dtype=bool)
+
+        # External signals: rate of every neuron per signal, and the pending rate changes (see compile_schedule)
+        self.rates = {signal: np.zeros(self.n_neurons) for signal in SIGNALS}
+        self.driven = {signal: np.array([], dtype=np.int64) for signal in SIGNALS}
+        self.rate_changes = []
+        self.next_change = 0
+
+        # Declare devices
+        self.recording = {}
+        for name in ('cx', 'in', 'tc', 're'):
+            setattr(self, f"mult_{name}", None)
+            setattr(self, f"spikes_{name}", None)
+
+        # Remember the initial state, see reset()
+        self.store_states = store_states
+        self.states = {}
+        if store_states:
+            self.store_state('initial')
+
+        # Display result
+        logger.info(f"Reference network created: {self.n_neurons} neurons, {self.estimate['plastic_synapses']} plastic synapses.")
+
+    @property
+    def biological_time(self):
+        """
+        Simulated time (ms), as nest.biological_time.
+        """
+        return self.steps * self.resolution
+
+    def set_sleep_params(self):
+        """
+        Parameters' change of the sleep stage, as Network.set_sleep_params: b=60 in the cx population, in -> cx weights
+        set to -0.5 and asymmetric STDP (alpha=3.0) in the recurrent cx connectivity.
+        """
+        self.b[self.slices['cx']] = 60
+        self.static_weights["incx"] = -0.5
+        self.stdp["cxcx"]["alpha"] = 3.0
+
+    def set_awake_params(self):
+        """
+        Undo set_sleep_params, as Network.set_awake_params.
+        """
+        self.b[self.slices['cx']] = AEIF_PARAMS["b"]
+        self.static_weights["incx"] = -4
+        self.stdp["cxcx"]["alpha"] = 1.0
+
+    def freeze_plasticity(self):
+        """
+        Freeze the weights of the three plastic projections (STDP learning rate lambda set to 0).
+        """
+        for params in self.stdp.values():
+            params["lambda"] = 0.0
+
+    def store_state(self, label):
+        """
+        Store the current state of the network under a label, as Network.store_state: neuron state and parameters,
+        plastic weights and STDP parameters, static weights and spikes in transit.
+        """
+        self.states[label] = {"neurons": {key: getattr(self, key).copy() for key in NEURON_STATE},
+                              "weights": {projection: weights.copy() for projection, weights in self.weights.items()},
+                              "stdp": {projection: dict(params) for projection, params in self.stdp.items()},
+                              "static_weights": dict(self.static_weights)}
+
+    def reset(self, label='initial', clear_recordings=True):
+        """
+        Bring the network back to a state stored with store_state() and switch the external signals off, as
+        Network.reset. The simulation continues from the current time.
+        """
+        assert label in self.states, f"Type one of {list(self.states)}, or store the state first (see store_state)."
+
+        state = self.states[label]
+        for key, values in state["neurons"].items():
+            setattr(self, key, values.copy())
+        self.weights = {projection: weights.copy() for projection, weights in state["weights"].items()}
+        self.stdp = {projection: dict(params) for projection, params in state["stdp"].items()}
+        self.static_weights = dict(state["static_weights"])
+
+        # Switch the signals off
+        for signal in SIGNALS:
+            self.rates[signal][:] = 0.0
+            self.driven[signal] = np.array([], dtype=np.int64)
+        self.rate_changes = []
+        self.next_change = 0
+
+        if clear_recordings:
+            for name in self.recording:
+                for recorder in (getattr(self, f"mult_{name}"), getattr(self, f"spikes_{name}")):
+                    if recorder is not None:
+                        recorder.chunks = []
+
+        logger.info(f"Network reset to the {label} state.")
+
+    def get_weights(self, projection):
+        """
+        Weights of a plastic projection, in the format of Network.get_weights.
+
+        Returns:
+            Dict: 'sources' and 'targets' (int32 indices within the pre and post populations), 'weights' (float32) and
+                  'shape' (sizes of the pre and post populations).
+        """
+        assert projection in PLASTIC_PROJECTIONS, f"Type one of {list(PLASTIC_PROJECTIONS)}."
+
+        weights = self.weights[projection]
+        mask = self.masks[projection]
+        sources, targets = np.nonzero(np.ones(weights.shape, dtype=bool) if mask is None else mask)
+
+        return {"sources": sources.astype(np.int32),
+                "targets": targets.astype(np.int32),
+                "weights": weights[sources, targets].astype(np.float32),
+                "shape": weights.shape}
+
+    def connect_all_devices(self, recording=None):
+        """
+        Create the V_m and spike recorders of the four populations, with the configuration of
+        Network.connect_all_devices(); only the 'memory' backend is available.
+
+        :param recording: Configuration per population ('cx', 'in', 'tc', 're'), with the keys of RECORDING_DEFAULTS.
+        :type: dict
+        """
+        # Assert argument is valid
+        recording = recording or {}
+        unknown = set(recording) - {'cx', 'in', 'tc', 're'}
+        assert not unknown, f"Unknown populations: {sorted(unknown)}."
+
+        self.recording = {}
+        for name in ('cx', 'in', 'tc', 're'):
+            config = recording.get(name, {})
+            assert not set(config) - set(RECORDING_DEFAULTS), f"Unknown recording options: {sorted(set(config) - set(RECORDING_DEFAULTS))}."
+            config = self.recording[name] = {**RECORDING_DEFAULTS, **config}
+            assert config["record_to"] == 'memory', "The reference engine only records to memory."
+
+            recorded = self.recorded_neurons(name)
+            neurons = np.asarray(recorded.tolist() if recorded is not None else [], dtype=np.int64) - 1
+
+            if config["voltage"]:
+                interval = max(int(round(config["interval"] / self.resolution)), 1)
+                setattr(self, f"mult_{name}", Recorder(neurons, interval, config["phases"]))
+
+            if config["spikes"]:
+                setattr(self, f"spikes_{name}", Recorder(neurons, None, config["phases"]))
+
+    def recorded_neurons(self, name):
+        """
+        Neurons of a population recorded according to the configuration given to connect_all_devices(), or None when
+        no neuron is recorded (neurons=0).
+        """
+        population = getattr(self, f"{name}_pop")
+        neurons = self.recording[name]["neurons"]
+
+        if neurons is None:
+            return population
+
+        if isinstance(neurons, numbers.Integral):
+            assert neurons >= 0, "Type an int value higher than or equal to 0."
+            return self.sample_neurons(population, int(neurons)) if neurons > 0 else None
+
+        return population[np.unique(neurons)]
+
+    def sample_neurons(self, population, n):
+        """
+        Sample of n evenly spaced neurons of a population.
+        """
+        indices = np.linspace(0, len(population) - 1, min(n, len(population))).astype(int)
+
+        return population[np.unique(indices)]
+
+    def gate_recorders(self, phase):
+        """
+        Switch on the recorders that record in the given phase and switch off the others. Recorders without phases are
+        left untouched.
+        """
+        for name in self.recording:
+            for recorder in (getattr(self, f"mult_{name}"), getattr(self, f"spikes_{name}")):
+                if recorder is not None and recorder.phases is not None:
+                    recorder.active = phase in recorder.phases
+
+    def compile_schedule(self, schedule):
+        """
+        Compile a Schedule into rate changes of the external signals, as the generators of Network.compile_schedule:
+        30 kHz to the active tc neurons, 2 kHz to the trained cx group, 10 kHz to the in population and 700 Hz to the
+        cortex during sleep. The schedule starts at the current simulation time.
+
+        Returns:
+            Dict: the number of rate changes by signal.
+        """
+        # Declare variables
+        TRAIN_RATE = 30000.0                                # Hz
+        CONTEXT_RATE = 2000.0                               # Hz
+        INHIB_RATE = 10000.0                                # Hz
+        OSC_RATE = 700.0                                    # Hz
+        n_groups = self.cx_n // self.SET_CX_NEURON
+        changes = []
+
+        def add(signal, neurons, traces):
+            # One (step, signal, neurons, rate) change per time of every trace
+            for neuron, (times, values) in zip(neurons, traces):
+                for time, value in zip(times, values):
+                    changes.append((self.steps + int(round(time / self.resolution)), signal, neuron, value))
+
+        cx, tc, in_ = (np.arange(self.n_neurons)[self.slices[name]] for name in ('cx', 'tc', 'in'))
+
+        if schedule.presentations:
+            add('train', tc, schedule.tc_traces(self.TC_N, TRAIN_RATE))
+        if any(p["group"] is not None for p in schedule.presentations):
+            add('context', cx.reshape(n_groups, -1), schedule.context_traces(n_groups, CONTEXT_RATE))
+        if any(p["inhibit"] for p in schedule.presentations):
+            add('inhib', [in_], [schedule.inhib_trace(INHIB_RATE)])
+        if schedule.sleeps:
+            add('sleep', [cx], [schedule.sleep_trace(OSC_RATE)])
+
+        # Pending changes, sorted by step
+        self.rate_changes = sorted(self.rate_changes[self.next_change:] + changes, key=lambda change: change[0])
+        self.next_change = 0
+
+        return {signal: sum(1 for change in changes if change[1] == signal) for signal in SIGNALS}
+
+    def run_schedule(self, schedule):
+        """
+        Compile a Schedule and simulate it phase by phase, switching the sleep and awake parameters and gating the
+        recorders as Network.run_schedule.
+        """
+        self.compile_schedule(schedule)
+
+        previous_phase = None
+        for phase, start, stop in schedule.phases:
+            if phase == 'sleep':
+                self.set_sleep_params()
+            elif previous_phase == 'sleep':
+                self.set_awake_params()
+            if phase != previous_phase:
+                self.gate_recorders(phase)
+            previous_phase = phase
+
+            logger.info(f"Simulating {phase} phase ({stop - start} ms)...")
+            self.simulate(stop - start)
+
+            # Remember the post-training state, see reset()
+            if phase == 'training' and self.store_states:
+                self.store_state('trained')
+
+        logger.info("...done.")
+
+    def _apply_rate_changes(self):
+        """
+        Apply the rate changes due at the current step.
+        """
+        changed = set()
+        while self.next_change < len(self.rate_changes) and self.rate_changes[self.next_change][0] <= self.steps:
+            _, signal, neurons, rate = self.rate_changes[self.next_change]
+            self.rates[signal][neurons] = rate
+            changed.add(signal)
+            self.next_change += 1
+
+        for signal in changed:
+            self.driven[signal] = np.flatnonzero(self.rates[signal])
+
+    def simulate(self, duration):
+        """
+        Advance the network by duration ms, as nest.Simulate.
+
+        :param duration: Simulated time (ms).
+        :type: float
+        """
+        # Declare variables
+        p = AEIF_PARAMS
+        dt = self.resolution
+        n_steps = int(round(duration / dt))
+        ref_steps = int(round(p["t_ref"] / dt))
+        decay_ex, decay_in = np.exp(-dt / p["tau_syn_ex"]), np.exp(-dt / p["tau_syn_in"])
+        decay_plus, decay_minus = np.exp(-dt / STDP_PARAMS["tau_plus"]), np.exp(-dt / p["tau_minus"])
+        static = {name: (self.slices[pre], self.slices[post]) for name, (pre, post) in STATIC_PROJECTIONS.items()}
+        plastic = {projection: (self.slices[pre], self.slices[post]) for projection, (pre, post, _) in PLASTIC_PROJECTIONS.items()}
+        recorders = [getattr(self, f"{kind}_{name}") for name in self.recording for kind in ('mult', 'spikes')]
+        recorders = [recorder for recorder in recorders if recorder is not None]
+
+        for _ in range(n_steps):
+            self._apply_rate_changes()
+
+            # Spikes emitted one delay ago
+            slot = self.steps % self.delay_steps
+            arrived = self.in_transit[slot]
+            input_ex = np.zeros(self.n_neurons)
+            input_in = np.zeros(self.n_neurons)
+
+            # Static synapses: uniform weights, the input is the number of presynaptic spikes times the weight
+            for name, (pre, post) in static.items():
+                n_spikes = np.count_nonzero(arrived[pre])
+                if n_spikes:
+                    weight = self.static_weights[name]
+                    (input_ex if weight > 0 else input_in)[post] += abs(weight) * n_spikes
+
+            # Plastic synapses: input and depression at the arrival of the presynaptic spikes
+            self.k_plus *= decay_plus
+            self.k_minus *= decay_minus
+            for projection, (pre, post) in plastic.items():
+                sources = np.flatnonzero(arrived[pre])
+                if len(sources):
+                    weights = self.weights[projection]
+                    input_ex[post] += weights[sources].sum(axis=0)
+
+                    params = self.stdp[projection]
+                    if params["lambda"]:
+                        weights[sources] = np.maximum(weights[sources] - params["alpha"] * params["lambda"] * weights[sources] * self.k_minus[post], 0.0)
+            self.k_plus += arrived
+
+            # External signals: independent Poisson trains for every target
+            for signal, (_, weight) in SIGNALS.items():
+                driven = self.driven[signal]
+                if len(driven):
+                    input_ex[driven] += weight * self.rng.poisson(self.rates[signal][driven] * dt * 1e-3)
+
+            # Neuron dynamics
+            V = self.V_m
+            I = (-p["g_L"] * (V - p["E_L"])
+                 + p["g_L"] * p["Delta_T"] * np.exp((np.minimum(V, p["V_peak"]) - p["V_th"]) / p["Delta_T"])
+                 - self.g_ex * (V - p["E_ex"]) - self.g_in * (V - p["E_in"]) - self.w + p["I_e"])
+            dw = (p["a"] * (V - p["E_L"]) - self.w) / p["tau_w"]
+
+            refractory = self.refractory > 0
+            self.V_m = np.where(refractory, p["V_reset"], V + dt * I / p["C_m"])
+            self.w += dt * dw
+            self.refractory[refractory] -= 1
+
+            # Alpha conductances: exact propagation, then the input of this step
+            self.g_ex = (self.g_ex + dt * self.dg_ex) * decay_ex
+            self.dg_ex *= decay_ex
+            self.g_in = (self.g_in + dt * self.dg_in) * decay_in
+            self.dg_in *= decay_in
+            self.dg_ex += input_ex * np.e / p["tau_syn_ex"]
+            self.dg_in += input_in * np.e / p["tau_syn_in"]
+
+            # Spikes
+            spikes = self.V_m >= p["V_peak"]
+            if spikes.any():
+                self.V_m[spikes] = p["V_reset"]
+                self.w[spikes] += self.b[spikes]
+                self.refractory[spikes] = ref_steps
+
+                # Potentiation at the postsynaptic spikes
+                for projection, (pre, post) in plastic.items():
+                    targets = np.flatnonzero(spikes[post])
+                    params = self.stdp[projection]
+                    if len(targets) and params["lambda"]:
+                        weights = self.weights[projection]
+                        increase = params["lambda"] * (params["Wmax"] - weights[:, targets]) * self.k_plus[pre, None]
+                        if self.masks[projection] is not None:
+                            increase *= self.masks[projection][:, targets]
+                        weights[:, targets] = np.minimum(weights[:, targets] + increase, params["Wmax"])
+                self.k_minus += spikes
+
+            self.in_transit[slot] = spikes
+            self.steps += 1
+
+            # Recorders
+            for recorder in recorders:
+                if not recorder.active:
+                    continue
+                if recorder.interval is None:
+                    senders = recorder.neurons[spikes[recorder.neurons]]
+                    if len(senders):
+                        recorder.chunks.append((senders.astype(np.int32) + 1,
+                                                np.full(len(senders), self.biological_time, dtype=np.float32)))
+                elif self.steps % recorder.interval == 0:
+                    recorder.chunks.append((recorder.neurons.astype(np.int32) + 1,
+                                            np.full(len(recorder.neurons), self.biological_time, dtype=np.float32),
+                                            self.V_m[recorder.neurons].astype(np.float32)))
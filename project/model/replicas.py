@@ -0,0 +1,107 @@
+import logging
+
+import numpy as np
+
+from .analysis import node_indices, presentation_responses
+from .lazy import LazyModule
+from .network import Network
+from .schedule import Schedule
+
+# Imported at its first use, see LazyModule
+nest = LazyModule('nest')
+
+logger = logging.getLogger(__name__)
+
+
+class Replicas:
+    """
+        K disconnected copies of a trained network in one NEST kernel, sharing its trained weights.
+
+        A network of 9 training images has about 900 neurons, too few to keep several threads busy: the per-step
+        overhead dominates. With K replicas the kernel simulates K times more neurons per step, so that K test images
+        are presented per time step and the threads are used. Every replica is restored from the same checkpoint, gets
+        its own stimulus and its own cx spike recorder, and its responses are mapped back to the images it was fed.
+    """
+
+    def __init__(self, checkpoint, n_replicas, kernel=None, **network_kwargs):
+        """
+        Replicas creation: n_replicas networks restored from the checkpoint (see Network.from_checkpoint), with the
+        awake parameters (a checkpoint saved after sleep holds the sleep ones), the plasticity frozen and only the cx
+        spikes recorded.
+
+        :param checkpoint: Checkpoint file of the trained network (see Network.save_checkpoint).
+        :type: str
+
+        :param n_replicas: Number of replicas.
+        :type: int
+
+        :param kernel: Kernel configuration (see Network), applied once, e.g. {"threads": 8}. It requires a fresh kernel.
+        :type: dict
+
+        :param network_kwargs: Other arguments of the Network creation; the weight tracking must be 'summary' (default).
+        """
+        assert isinstance(n_replicas, int) and n_replicas > 0, "Type an int value higher than 0."
+        assert network_kwargs.get('weight_tracking', 'summary') == 'summary', "Replicas do not record weights."
+
+        # Restore every replica, configuring the kernel with the first one
+        self.networks = []
+        for replica in range(n_replicas):
+            net = Network.from_checkpoint(checkpoint, kernel=kernel if replica == 0 else None, **network_kwargs)
+            if net.regime != 'awake':
+                net.set_awake_params()
+            net.freeze_plasticity()
+            net.connect_all_devices({"cx": {"voltage": False},
+                                     "in": {"voltage": False, "spikes": False},
+                                     "tc": {"voltage": False, "spikes": False},
+                                     "re": {"voltage": False, "spikes": False}})
+            self.networks.append(net)
+
+        # Display result
+        logger.info(f"{n_replicas} replicas successfully created.")
+
+    def retrieve(self, feature_vectors, group_size=20):
+        """
+        Retrieval of a set of images, split in contiguous chunks across the replicas and simulated with a single
+        nest.Simulate call.
+
+        :param feature_vectors: Binary feature vectors of the test images, with shape (n_images, 324).
+        :type: np.ndarray
+
+        :param group_size: Neurons per counted group: 20 for the cx groups (default), 1 for per-neuron counts.
+        :type: int
+
+        Returns:
+            np.ndarray: spike counts with shape (n_images, cx_n // group_size), in the order of the feature vectors.
+        """
+        # Declare variables
+        feature_vectors = np.asarray(feature_vectors)
+        chunks = np.array_split(np.arange(len(feature_vectors)), len(self.networks))
+        responses = np.zeros((len(feature_vectors), self.networks[0].cx_n // group_size), dtype=np.int64)
+        t0 = nest.biological_time
+        schedules = []
+
+        # Stimulus of every replica
+        for net, chunk in zip(self.networks, chunks):
+            schedule = Schedule()
+            for feature_vector in feature_vectors[chunk]:
+                schedule.add_retrieval(feature_vector)
+            if len(chunk):
+                net.compile_schedule(schedule)
+            schedules.append(schedule)
+
+        # All the replicas at once
+        duration = max(schedule.duration for schedule in schedules)
+        logger.info(f"Simulating retrieval of {len(feature_vectors)} images on {len(self.networks)} replicas ({duration} ms)...")
+        nest.Simulate(duration)
+
+        # Responses of every replica, mapped back to its images
+        for net, chunk, schedule in zip(self.networks, chunks, schedules):
+            events = net.spikes_cx.get('events')
+            net.spikes_cx.set(n_events=0)
+            if len(chunk):
+                # Indices within the cx population, which also hold for a grown population (see Network.add_groups)
+                senders = node_indices(net.cx_pop, events["senders"])
+                responses[chunk] = presentation_responses(senders, events["times"], schedule.presentation_windows() + t0,
+                                                          0, net.cx_n, group_size)
+
+        return responses
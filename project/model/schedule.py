@@ -0,0 +1,182 @@
+import numpy as np
+
+class Schedule:
+    """
+        The Schedule class describes a whole experimental protocol (training, retrieval and sleep phases) as a timeline,
+        so that Network.run_schedule() can compile it into a small fixed set of rate-modulated generators and run every
+        phase with a single nest.Simulate call.
+
+        Times are in ms, relative to the start of the schedule.
+    """
+
+    def __init__(self, period=900.0, train_dur=650.0, context_dur=450.0):
+        """
+        Schedule creation.
+
+        Every image presentation (training or retrieval) lasts period ms: the thalamic input is on from 1 ms to train_dur,
+        the contextual signal from 3 ms to context_dur and the inhibitory signal from 1 ms to context_dur, as in
+        Network.create_train_signal(), create_context_signal() and create_inhib_signal().
+
+        :param period: Duration of one presentation, signal plus quiescent period. Defaults to 900 ms.
+        :type: float
+
+        :param train_dur: End of the thalamic (training) signal within a presentation. Defaults to 650 ms.
+        :type: float
+
+        :param context_dur: End of the contextual and inhibitory signals within a presentation. Defaults to 450 ms.
+        :type: float
+        """
+        assert train_dur < period and context_dur < period, "The signals must end before the end of the presentation."
+
+        self.period = period
+        self.train_dur = train_dur
+        self.context_dur = context_dur
+
+        # Timeline
+        self.presentations = []                 # One dict per training/retrieval presentation
+        self.sleeps = []                        # (start, stop) of every sleep phase
+        self.phases = []                        # [phase, start, stop] of consecutive blocks of the same phase
+        self.duration = 0.0
+
+    def _append(self, phase, duration):
+        """
+        Extend the timeline by duration ms of the given phase, merging it with the previous block if it is the same phase.
+        """
+        start = self.duration
+        self.duration += duration
+
+        if self.phases and self.phases[-1][0] == phase:
+            self.phases[-1][2] = self.duration
+        else:
+            self.phases.append([phase, start, self.duration])
+
+        return start
+
+    def add_training(self, feature_vector, neuron_group, inhibit=False):
+        """
+        Present a training image: thalamic input to the active tc neurons and contextual signal to the given cx group.
+
+        :param feature_vector: Binary feature vector of the image (length 324).
+        :type: list
+
+        :param neuron_group: Index of the group of 20 cx neurons that encodes the image.
+        :type: int
+
+        :param inhibit: Also provide the inhibitory signal to the in population. Defaults to False.
+        :type: bool
+        """
+        assert isinstance(neuron_group, int) and neuron_group >= 0, "Type an int value higher than 0."
+
+        start = self._append('training', self.period)
+        self.presentations.append({"phase": 'training',
+                                   "start": start,
+                                   "tc_indices": np.flatnonzero(np.asarray(feature_vector)),
+                                   "group": neuron_group,
+                                   "inhibit": inhibit})
+
+    def add_retrieval(self, feature_vector):
+        """
+        Present a test image: only the thalamic input is provided, the contextual signal is off.
+
+        :param feature_vector: Binary feature vector of the image (length 324).
+        :type: list
+        """
+        start = self._append('retrieval', self.period)
+        self.presentations.append({"phase": 'retrieval',
+                                   "start": start,
+                                   "tc_indices": np.flatnonzero(np.asarray(feature_vector)),
+                                   "group": None,
+                                   "inhibit": False})
+
+    def add_sleep(self, duration=600000.0):
+        """
+        Sleep-like slow oscillation phase: non-specific noise to the cortex, no external stimulus (see Network.input_sleep).
+
+        :param duration: Duration of the phase. Defaults to 600 s.
+        :type: float
+        """
+        start = self._append('sleep', duration)
+        self.sleeps.append((start, self.duration))
+
+    def presentation_windows(self, phase=None):
+        """
+        Start and stop times of the presentations (the whole period of each presentation).
+
+        :param phase: 'training' or 'retrieval' to keep only one phase; all presentations when None.
+        :type: str
+
+        Returns:
+            np.ndarray: array of shape (n_presentations, 2).
+        """
+        starts = [p["start"] for p in self.presentations if phase is None or p["phase"] == phase]
+
+        return np.column_stack([starts, np.add(starts, self.period)]).reshape(-1, 2)
+
+    def rate_trace(self, starts, stops, rate):
+        """
+        Rate times and values of an inhomogeneous Poisson generator that is on at the given rate in every [start, stop)
+        interval and off otherwise.
+
+        Returns:
+            Tuple: the rate times and the rate values.
+        """
+        starts = np.asarray(starts, dtype=float)
+        stops = np.asarray(stops, dtype=float)
+
+        rate_times = np.column_stack([starts, stops]).ravel()
+        rate_values = np.tile([rate, 0.0], len(starts))
+
+        return rate_times, rate_values
+
+    def tc_traces(self, n_tc, rate):
+        """
+        Rate traces of the thalamic input, one per tc neuron.
+
+        :param n_tc: Size of the tc population.
+        :type: int
+
+        :param rate: Rate of the training signal (Hz).
+        :type: float
+
+        Returns:
+            List: (rate_times, rate_values) of every tc neuron.
+        """
+        starts = np.array([p["start"] for p in self.presentations], dtype=float)
+
+        # Activity of every tc neuron in every presentation
+        active = np.zeros((len(self.presentations), n_tc), dtype=bool)
+        for i, p in enumerate(self.presentations):
+            active[i, p["tc_indices"]] = True
+
+        return [self.rate_trace(starts[active[:, j]] + 1.0, starts[active[:, j]] + self.train_dur, rate) for j in range(n_tc)]
+
+    def context_traces(self, n_groups, rate):
+        """
+        Rate traces of the contextual signal, one per group of cx neurons.
+
+        Returns:
+            List: (rate_times, rate_values) of every group.
+        """
+        traces = []
+
+        for group in range(n_groups):
+            starts = np.array([p["start"] for p in self.presentations if p["group"] == group], dtype=float)
+            traces.append(self.rate_trace(starts + 3.0, starts + self.context_dur, rate))
+
+        return traces
+
+    def inhib_trace(self, rate):
+        """
+        Rate trace of the inhibitory signal to the in population.
+        """
+        starts = np.array([p["start"] for p in self.presentations if p["inhibit"]], dtype=float)
+
+        return self.rate_trace(starts + 1.0, starts + self.context_dur, rate)
+
+    def sleep_trace(self, rate):
+        """
+        Rate trace of the slow oscillation noise to the cortex.
+        """
+        sleeps = np.array(self.sleeps, dtype=float).reshape(-1, 2)
+
+        return self.rate_trace(sleeps[:, 0] + 1.0, sleeps[:, 1], rate)
@@ -0,0 +1,18 @@
+import numpy as np
+
+from model.reference import ReferenceNetwork
+from model.schedule import Schedule
+
+
+def test_depression_keeps_weights_non_negative():
+    # Strongly asymmetric STDP, so that a single depression step would take the weights below zero without the clamp
+    net = ReferenceNetwork(1, kernel={"seed": 1})
+    for params in net.stdp.values():
+        params["alpha"] = 500.0
+
+    schedule = Schedule()
+    schedule.add_training(np.arange(324) % 4 == 0, 0)
+    net.run_schedule(schedule)
+
+    for projection in net.weights:
+        assert net.get_weights(projection)["weights"].min() >= 0.0